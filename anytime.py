@@ -0,0 +1,187 @@
+import time
+
+from basket import Basket
+from discounts import Discount, BundleDiscount, ProgressiveDiscount, BulkDiscount
+from solver import DiscountSolver, GroupResult
+from metrics import instrumented, registry
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AnytimeSolver(DiscountSolver):
+    """DiscountSolver with a time budget per search.
+
+    solve_groups shares one budget between all the groups it solves. Every
+    conflict group starts from a greedy sequence and is then searched
+    exactly, one first discount at a time. If the exact search does not finish
+    in half of the remaining time, the best sequence found so far is improved
+    by swapping pairs of discounts until the budget runs out; proven is then
+    False and gap is how far above a lower bound its price may be.
+    """
+
+    def __init__(self, budget: float = 0.05) -> None:
+        self.budget = budget
+        self.proven = True
+        self.gap = 0
+        self.deadline = None
+        self.search_deadline = None
+
+    def solve_groups(self, basket: Basket, groups: list[list[tuple[int, Discount]]]) -> list[GroupResult]:
+        self.search_deadline = time.perf_counter() + self.budget
+        results = []
+        try:
+            for group in groups:
+                price_change, sequence = self.solve(basket, group)
+                results.append((price_change, sequence, self.proven, self.gap))
+        finally:
+            self.search_deadline = None
+        return results
+
+    @instrumented("solver.solve", lambda solver, basket, discounts: {"basket_size": basket.get_size(),
+                                                                     "active_discounts": len(discounts)})
+    def solve(self, basket: Basket, discounts: list[tuple[int, Discount]]) -> tuple[int, list[tuple[int, Discount]]]:
+        consumed = self.prepare(discounts, basket.get_unassigned_lines(
+            {name for _, discount in discounts for name in discount.get_items_names()}))
+        if self.search_deadline is not None:
+            self.deadline = self.search_deadline
+        else:
+            self.deadline = time.perf_counter() + self.budget
+        self.proven = True
+        price_change = 0
+        sequence = []
+        for group in self.split_into_groups(self.get_live_discounts(range(len(discounts)), consumed)):
+            group_price_change, group_sequence = self.search_group(group, consumed)
+            price_change += group_price_change
+            sequence.extend(group_sequence)
+        self.deadline = None
+
+        self.gap = 0 if self.proven else price_change - self.get_lower_bound()
+        if registry.enabled:
+            registry.increment("solver.proven" if self.proven else "solver.unproven")
+            registry.observe("solver.gap", self.gap)
+        return price_change, [discounts[index] for index in sequence]
+
+    def search_group(self, group: tuple[int, ...], consumed: dict[str, int]) -> tuple[int, list[int]]:
+        best = self.get_greedy_sequence(group, consumed)
+        deadline = self.deadline
+        self.deadline = time.perf_counter() + max(0.0, deadline - time.perf_counter()) / 2
+        best_exact = None
+        try:
+            for index in group:
+                price_change, rest, new_consumed = self.get_price_change_starting_with(index, group, consumed)
+                if best_exact is None or price_change < best_exact[0]:
+                    exact_deadline, self.deadline = self.deadline, None
+                    best_exact = price_change, [index] + self.get_sequence(rest, new_consumed)
+                    self.deadline = exact_deadline
+        except SearchTimeout:
+            self.proven = False
+            self.deadline = deadline
+            if best_exact is not None and best_exact[0] < best[0]:
+                best = best_exact
+            return self.improve(best, group, consumed)
+        self.deadline = deadline
+        return best_exact
+
+    def improve(self, best: tuple[int, list[int]], group: tuple[int, ...],
+                consumed: dict[str, int]) -> tuple[int, list[int]]:
+        order = best[1] + [index for index in group if index not in best[1]]
+        improved = True
+        while improved:
+            improved = False
+            for first in range(len(order)):
+                for second in range(first + 1, len(order)):
+                    if time.perf_counter() > self.deadline:
+                        return best
+                    candidate = order.copy()
+                    candidate[first], candidate[second] = candidate[second], candidate[first]
+                    result = self.evaluate_order(candidate, consumed)
+                    if result[0] < best[0]:
+                        best, order, improved = result, candidate, True
+        return best
+
+    def evaluate_order(self, order: list[int], consumed: dict[str, int]) -> tuple[int, list[int]]:
+        price_change = 0
+        sequence = []
+        for index in order:
+            transition = self.get_transition(index, consumed)
+            if transition is not None:
+                price_change += transition[0]
+                consumed = transition[1]
+                sequence.append(index)
+        return price_change, sequence
+
+    def get_greedy_sequence(self, group: tuple[int, ...], consumed: dict[str, int]) -> tuple[int, list[int]]:
+        price_change = 0
+        sequence = []
+        remaining = list(group)
+        while remaining:
+            best = None
+            for index in remaining:
+                transition = self.get_transition(index, consumed)
+                if transition is not None and (best is None or transition[0] < best[1][0]):
+                    best = index, transition
+            if best is None:
+                break
+            index, (discount_price_change, consumed) = best
+            price_change += discount_price_change
+            sequence.append(index)
+            remaining.remove(index)
+        return price_change, sequence
+
+    def get_best_group_price_change(self, group: tuple[int, ...], consumed: dict[str, int]) -> int:
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        return super().get_best_group_price_change(group, consumed)
+
+    def get_lower_bound(self) -> int:
+        """Lower bound of the price change of the whole search.
+
+        Every unit gets at most one discount. Bulk discounts may lower every
+        unit of their product, a progressive discount at most one unit per
+        group and a bundle discount at most its free units per bundle set, so
+        the bound adds those capped savings on the units where they are
+        largest.
+        """
+        discounts_by_name = {}
+        for index, (_, discount) in enumerate(self.discounts):
+            for name in discount.get_items_names():
+                discounts_by_name.setdefault(name, []).append((index, discount))
+
+        price_change = 0
+        extras_by_discount = {}
+        for name, runs in self.lines.items():
+            for _, quantity, price in runs:
+                discounts = discounts_by_name.get(name, [])
+                saving = max((price - discount.new_price for _, discount in discounts
+                              if isinstance(discount, BulkDiscount) and discount.new_price < price), default=0)
+                price_change -= quantity * saving
+                for index, discount in discounts:
+                    match discount:
+                        case BundleDiscount():
+                            extra = price - saving
+                        case ProgressiveDiscount():
+                            extra = round((discount.percentage_off_next/100)*price) - saving
+                        case _:
+                            continue
+                    if extra > 0:
+                        extras_by_discount.setdefault(index, []).append((extra, quantity))
+
+        for index, (_, discount) in enumerate(self.discounts):
+            extras = extras_by_discount.get(index)
+            if extras is None:
+                continue
+            match discount:
+                case BundleDiscount():
+                    units_count = len(range(discount.threshold)[:discount.threshold - discount.quantity_to_pay]) * \
+                        len(discount.bundle_sets)
+                case ProgressiveDiscount():
+                    units_count = sum(quantity for _, quantity, _ in self.lines.get(discount.item, [])) // \
+                        (discount.threshold + 1)
+            for extra, quantity in sorted(extras, reverse=True):
+                if units_count <= 0:
+                    break
+                price_change -= min(quantity, units_count) * extra
+                units_count -= quantity
+        return price_change
@@ -1,43 +1,215 @@
-from textwrap import dedent
+from array import array
+from io import StringIO
+from typing import TYPE_CHECKING, Iterator
+
+from item import Item
+from receipt import ReceiptLine, calculate_aws, write_receipt
+
+if TYPE_CHECKING:
+    from discounts import Discount
 
 
 class Basket:
+    """Basket with one entry per unit.
+
+    Lines hold a small id into the list of distinct products in the basket
+    instead of a reference per unit, and the positions of every product name
+    are kept in compact arrays for the discount kernels.
+    """
+
     def __init__(self) -> None:
-        self.items = []
+        self.products = []
+        self.product_ids_by_item = {}
+        self.product_ids = array("I")
+        self.discounted_prices = []
+        self.applied_discount_ids = []
+        self.indices_by_name = {}
+
+    def add_item(self, item: Item, quantity: int = 1) -> None:
+        product_id = self.product_ids_by_item.get(item)
+        if product_id is None:
+            product_id = self.product_ids_by_item[item] = len(self.products)
+            self.products.append(item)
+        size = len(self.product_ids)
+        indices = self.indices_by_name.get(item.name)
+        if indices is None:
+            indices = self.indices_by_name[item.name] = array("I")
+        indices.extend(range(size, size + quantity))
+        self.product_ids.extend([product_id] * quantity)
+        self.discounted_prices.extend([None] * quantity)
+        self.applied_discount_ids.extend([None] * quantity)
+
+    def get_item(self, position: int) -> Item:
+        return self.products[self.product_ids[position]]
+
+    def fork(self) -> "Basket":
+        basket = Basket.__new__(Basket)
+        basket.products = self.products.copy()
+        basket.product_ids_by_item = self.product_ids_by_item.copy()
+        basket.product_ids = self.product_ids[:]
+        basket.discounted_prices = self.discounted_prices.copy()
+        basket.applied_discount_ids = self.applied_discount_ids.copy()
+        basket.indices_by_name = {name: indices[:] for name, indices in self.indices_by_name.items()}
+        return basket
+
+    def apply_discount(self, discount: "Discount", discount_id: int) -> None:
+        discount.apply_to_basket(self, discount_id)
+
+    def get_unassigned_lines(self, items_names: set[str] | None = None) -> dict[str, list[tuple[int, int, int]]]:
+        lines = {}
+        products = self.products
+        for position, (product_id, applied_discount_id) in enumerate(zip(self.product_ids, self.applied_discount_ids)):
+            item = products[product_id]
+            if applied_discount_id is None and (items_names is None or item.name in items_names):
+                runs = lines.setdefault(item.name, [])
+                if runs and runs[-1][0] + runs[-1][1] == position and runs[-1][2] == item.normal_price:
+                    runs[-1] = (runs[-1][0], runs[-1][1] + 1, item.normal_price)
+                else:
+                    runs.append((position, 1, item.normal_price))
+        return lines
+
+    def get_items_names(self) -> set[str]:
+        return set(self.indices_by_name)
+
+    def is_empty(self) -> bool:
+        return not self.product_ids
+
+    def get_size(self) -> int:
+        return len(self.product_ids)
 
     def get_discounted_price(self) -> int:
-        item_prices = list(map(
-            lambda item: item.discounted_price if item.discounted_price is not None else item.normal_price, self.items))
-        return sum(item_prices)
+        products = self.products
+        return sum(discounted_price if discounted_price is not None else products[product_id].normal_price
+                   for product_id, discounted_price in zip(self.product_ids, self.discounted_prices))
 
     def get_total_price(self) -> int:
-        item_prices = list(map(
-            lambda item: item.normal_price, self.items))
-        return sum(item_prices)
-    
-    def get_receipt_str(self) -> str:
-        info = "Item, Category, Normal Price, Discounted Price, Applied Discount No.\n"
-        for item in self.items:
-            if item.discounted_price is not None:
-                discounted_price = item.discounted_price
-            else:
-                discounted_price = '-'
-            if item.applied_discount_id is not None:
-                discount_id = item.applied_discount_id + 1
-            else:
-                discount_id = 'no discount'
-            info = info + f"{item.name}, {item.category}, {item.normal_price}c, {discounted_price}, {discount_id}\n"
-        info = info + "----------------------------------\n"
-        total = self.get_total_price()
-        discounted_total = self.get_discounted_price()
-        aws_normal, clouds_normal = self.calculate_aws(total)
-        aws_discounted, clouds_discounted = self.calculate_aws(discounted_total)
-        prices = f"""\
-        Total price:          {total}c = {aws_normal} aws {clouds_normal} clouds
-        Price with discounts: {discounted_total}c = {aws_discounted} aws {clouds_discounted} clouds
-        Saved:                {total - discounted_total}c\
-        """
-        return info + dedent(prices)
-    
+        prices = [item.normal_price for item in self.products]
+        return sum(prices[product_id] for product_id in self.product_ids)
+
+    def get_receipt_lines(self) -> Iterator[tuple[ReceiptLine, int]]:
+        products = self.products
+        for product_id, discounted_price, applied_discount_id in zip(self.product_ids, self.discounted_prices, self.applied_discount_ids):
+            item = products[product_id]
+            yield (item.name, item.category, item.normal_price, discounted_price, applied_discount_id), 1
+
+    def get_receipt_str(self, receipt_format: str = "text") -> str:
+        output = StringIO()
+        write_receipt(self, output, receipt_format)
+        return output.getvalue()
+
     def calculate_aws(self, clouds:int) -> tuple[int, int]:
-        return clouds//100, clouds%100
+        return calculate_aws(clouds)
+
+
+class CountLine:
+    __slots__ = ("item", "position", "quantity",
+                 "discounted_price", "applied_discount_id")
+
+    def __init__(self, item: Item, position: int, quantity: int) -> None:
+        self.item = item
+        self.position = position
+        self.quantity = quantity
+        self.discounted_price = None
+        self.applied_discount_id = None
+
+    def copy(self) -> "CountLine":
+        line = CountLine(self.item, self.position, self.quantity)
+        line.discounted_price = self.discounted_price
+        line.applied_discount_id = self.applied_discount_id
+        return line
+
+    def split(self, quantity: int) -> "CountLine":
+        rest = self.copy()
+        rest.position = self.position + quantity
+        rest.quantity = self.quantity - quantity
+        self.quantity = quantity
+        return rest
+
+
+class CountBasket(Basket):
+    def __init__(self) -> None:
+        self.lines_by_name = {}
+        self.size = 0
+
+    def add_item(self, item: Item, quantity: int = 1) -> None:
+        lines = self.lines_by_name.setdefault(item.name, [])
+        if lines:
+            last = lines[-1]
+            if last.position + last.quantity == self.size and \
+                    last.item is item and last.applied_discount_id is None:
+                last.quantity += quantity
+                self.size += quantity
+                return
+        lines.append(CountLine(item, self.size, quantity))
+        self.size += quantity
+
+    def fork(self) -> "CountBasket":
+        basket = CountBasket()
+        basket.restore(self)
+        return basket
+
+    def restore(self, other: "CountBasket") -> None:
+        self.lines_by_name = {name: [line.copy() for line in lines]
+                              for name, lines in other.lines_by_name.items()}
+        self.size = other.size
+
+    def apply_discount(self, discount: "Discount", discount_id: int) -> None:
+        discount.apply_to_count_basket(self, discount_id)
+
+    def get_lines(self) -> list[CountLine]:
+        return sorted((line for lines in self.lines_by_name.values() for line in lines),
+                      key=lambda line: line.position)
+
+    def get_eligible_lines(self, items_names: set[str] | str) -> list[CountLine]:
+        if isinstance(items_names, str):
+            items_names = {items_names}
+        eligible = [line for name in items_names for line in self.lines_by_name.get(name, [])
+                    if line.applied_discount_id is None]
+        if len(items_names) > 1:
+            eligible.sort(key=lambda line: line.position)
+        return eligible
+
+    def take_units(self, lines: list[CountLine], quantity: int) -> list[CountLine]:
+        taken = []
+        for line in lines:
+            if quantity <= 0:
+                break
+            if line.quantity > quantity:
+                rest = line.split(quantity)
+                name_lines = self.lines_by_name[line.item.name]
+                name_lines.insert(name_lines.index(line) + 1, rest)
+            taken.append(line)
+            quantity -= line.quantity
+        return taken
+
+    def get_unassigned_lines(self, items_names: set[str] | None = None) -> dict[str, list[tuple[int, int, int]]]:
+        lines = {}
+        for name, name_lines in self.lines_by_name.items():
+            if items_names is not None and name not in items_names:
+                continue
+            for line in name_lines:
+                if line.applied_discount_id is None:
+                    lines.setdefault(name, []).append((line.position, line.quantity, line.item.normal_price))
+        return lines
+
+    def get_items_names(self) -> set[str]:
+        return {name for name, lines in self.lines_by_name.items() if lines}
+
+    def is_empty(self) -> bool:
+        return self.size == 0
+
+    def get_size(self) -> int:
+        return self.size
+
+    def get_discounted_price(self) -> int:
+        return sum(line.quantity * (line.discounted_price if line.discounted_price is not None else line.item.normal_price)
+                   for lines in self.lines_by_name.values() for line in lines)
+
+    def get_total_price(self) -> int:
+        return sum(line.quantity * line.item.normal_price
+                   for lines in self.lines_by_name.values() for line in lines)
+
+    def get_receipt_lines(self) -> Iterator[tuple[ReceiptLine, int]]:
+        for line in self.get_lines():
+            yield (line.item.name, line.item.category, line.item.normal_price,
+                   line.discounted_price, line.applied_discount_id), line.quantity
@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import StringIO
+from itertools import islice
+from tempfile import TemporaryDirectory
+from typing import Iterator, TextIO
+
+from config import load_system
+from mapped import load_mapped_system, write_snapshot
+from metrics import registry
+from receipt import CSV_HEADER, write_receipt
+from system import System
+
+worker_system = None
+
+
+def read_baskets(path: str) -> Iterator[tuple[str, list[str] | ValueError]]:
+    """Yields the id and items of every basket. A JSONL line that is not a
+    basket is yielded with the error in place of its items, so that it is
+    reported like any other invalid basket instead of stopping the run.
+    """
+    with open(path, encoding="utf-8", newline="") as baskets_file:
+        if path.endswith(".csv"):
+            for line_number, row in enumerate(csv.reader(baskets_file), start=1):
+                if row:
+                    yield row[0] or str(line_number), row[1:]
+            return
+        for line_number, line in enumerate(baskets_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                basket = json.loads(line)
+            except ValueError as error:
+                yield str(line_number), ValueError(f"invalid JSON: {error}")
+                continue
+            if isinstance(basket, list):
+                yield str(line_number), basket
+            elif not isinstance(basket, dict):
+                yield str(line_number), ValueError("the basket is not a list or an object")
+            elif "items" not in basket:
+                yield str(basket.get("id", line_number)), ValueError("the basket has no items")
+            else:
+                yield str(basket.get("id", line_number)), basket["items"]
+
+
+def parse_counted_items(items: list[str] | ValueError) -> list[tuple[str, int]]:
+    if isinstance(items, ValueError):
+        raise items
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        raise ValueError("the items must be a list of item names")
+    counted_items = []
+    for item in items:
+        item_name, separator, quantity = item.partition('*')
+        item_name, quantity = item_name.strip(), quantity.strip()
+        if not item_name:
+            continue
+        if separator and (not quantity.isnumeric() or int(quantity) == 0):
+            raise ValueError(f"invalid quantity for item \"{item_name}\"")
+        counted_items.append((item_name, int(quantity) if separator else 1))
+    return counted_items
+
+
+def init_worker(snapshot_path: str, metrics_enabled: bool = False, tracing: bool = False) -> None:
+    global worker_system
+    registry.init_worker(metrics_enabled, tracing)
+    worker_system = load_mapped_system(snapshot_path)
+
+
+def get_totals_line(basket_id: str, total: int, discounted_total: int) -> str:
+    return json.dumps({"id": basket_id, "total": total,
+                       "discounted_total": discounted_total, "saved": total - discounted_total}) + "\n"
+
+
+def price_basket(system: System, basket_id: str, items: list[str], output_format: str) -> str:
+    try:
+        counted_items = parse_counted_items(items)
+    except ValueError as error:
+        return json.dumps({"id": basket_id, "error": str(error)}) + "\n"
+    nonexistent_items = [item_name for item_name, _ in counted_items
+                         if item_name not in system.catalog]
+    if nonexistent_items:
+        return json.dumps({"id": basket_id, "error": f"items {nonexistent_items} do not exist"}) + "\n"
+
+    if output_format == "totals" and len({item_name for item_name, _ in counted_items}) == 1:
+        total, discounted_total = system.get_quote(counted_items[0][0],
+                                                   sum(quantity for _, quantity in counted_items))
+        return get_totals_line(basket_id, total, discounted_total)
+
+    system.empty_basket()
+    system.add_counted_items_to_basket(counted_items)
+    system.apply_best_discount_combination()
+    basket = system.basket
+    if output_format == "totals":
+        return get_totals_line(basket_id, basket.get_total_price(), basket.get_discounted_price())
+    output = StringIO()
+    if output_format in ("json", "csv"):
+        write_receipt(basket, output, output_format, basket_id)
+    else:
+        output.write(f"Basket {basket_id}\n")
+        write_receipt(basket, output, "text" if output_format == "receipts" else output_format)
+        output.write("\n")
+    if output_format != "csv":
+        output.write("\n")
+    return output.getvalue()
+
+
+def price_chunk(chunk: list[tuple[str, list[str]]], output_format: str) -> tuple[list[str], dict | None]:
+    return ([price_basket(worker_system, basket_id, items, output_format) for basket_id, items in chunk],
+            registry.take_snapshot())
+
+
+def get_chunk_lines(future: Future) -> list[str]:
+    lines, metrics = future.result()
+    registry.merge(metrics)
+    return lines
+
+
+def run_batch(system: System | None, snapshot_path: str | None, baskets_path: str, output: TextIO,
+              output_format: str = "totals", workers: int | None = None, chunk_size: int = 64) -> None:
+    baskets = read_baskets(baskets_path)
+    chunks = iter(lambda: list(islice(baskets, chunk_size)), [])
+    workers = workers or os.cpu_count() or 1
+    if output_format == "csv":
+        output.write(",".join(["basket"] + CSV_HEADER) + "\n")
+
+    if workers == 1:
+        if system is None:
+            system = load_mapped_system(snapshot_path)
+        for chunk in chunks:
+            output.writelines(price_basket(system, basket_id, items, output_format) for basket_id, items in chunk)
+        return
+
+    with TemporaryDirectory() as directory:
+        if snapshot_path is None:
+            snapshot_path = os.path.join(directory, "snapshot.bin")
+            write_snapshot(system.snapshot, snapshot_path)
+        max_pending_chunks = workers * 4
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(snapshot_path, registry.enabled,
+                                           registry.trace_events is not None)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(price_chunk, chunk, output_format))
+                if len(pending) >= max_pending_chunks:
+                    output.writelines(get_chunk_lines(pending.popleft()))
+            while pending:
+                output.writelines(get_chunk_lines(pending.popleft()))
+
+
+def main(config_path: str | None, store_path: str | None, baskets_path: str, output_path: str | None,
+         output_format: str, workers: int | None, snapshot_path: str | None = None) -> None:
+    system = None
+    if snapshot_path is None:
+        system = load_system(config_path, store_path)
+        if system is None:
+            return
+    if output_path is None:
+        run_batch(system, snapshot_path, baskets_path, sys.stdout, output_format, workers)
+        return
+    with open(output_path, "w", encoding="utf-8") as output:
+        run_batch(system, snapshot_path, baskets_path, output, output_format, workers)
@@ -0,0 +1,251 @@
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Any, Callable
+
+from basket import Basket
+from catalog import Catalog
+from discounts import BundleDiscount, ProgressiveDiscount, BulkDiscount
+from item import Item
+from matrix import MatrixPricer, np
+from system import System
+
+Benchmark = tuple[str, Callable[[], Any], Callable[[Any], Any]]
+
+MEMORY_TARGETS = {"catalog_entry_bytes": 176, "basket_line_bytes": 32}
+
+
+def generate_system(seed: int, items_count: int, discounts_count: int, overlap: float = 0.5,
+                    count_basket: bool = False) -> System:
+    generator = random.Random(seed)
+    system = System(count_basket=count_basket)
+    for index in range(items_count):
+        system.add_catalog_item(f"item{index}", str(generator.randint(10, 500)),
+                                f"category{index % 20}")
+
+    items_names = system.get_items_names()
+    pool_size = max(3, min(items_count, round(discounts_count * 2 * (1 - overlap))))
+    pool = items_names[:pool_size]
+    for _ in range(discounts_count):
+        match generator.choice(["bundle", "progressive", "bulk"]):
+            case "bundle":
+                threshold = generator.randint(2, 4)
+                bundle = generator.sample(pool, min(len(pool), generator.randint(2, 3)))
+                system.add_bundle_discount(str(threshold), str(threshold - 1), [bundle])
+            case "progressive":
+                system.add_progressive_discount(str(generator.randint(1, 3)),
+                                                str(generator.choice([25, 50, 100])),
+                                                generator.choice(pool))
+            case "bulk":
+                item = system.catalog.get(generator.choice(pool))
+                system.add_bulk_discount(str(generator.randint(2, 5)),
+                                         str(max(1, item.normal_price * 3 // 4)), item.name)
+    return system
+
+
+def generate_basket(seed: int, system: System, size: int, discounted_share: float = 0.8) -> list[str]:
+    generator = random.Random(seed)
+    discounted_names = sorted({name for discount in system.discounts
+                               for name in discount.get_items_names()})
+    items_names = system.get_items_names()
+    return [generator.choice(discounted_names)
+            if discounted_names and generator.random() < discounted_share
+            else generator.choice(items_names)
+            for _ in range(size)]
+
+
+def scanning_benchmark(basket_size: int) -> Benchmark:
+    def setup() -> tuple[System, list[str]]:
+        system = generate_system(1, 1000, 10)
+        return system, generate_basket(2, system, basket_size)
+
+    def run(state: tuple[System, list[str]]) -> None:
+        system, basket = state
+        system.add_items_to_basket(basket)
+
+    return f"scan/basket={basket_size}", setup, run
+
+
+def checkout_benchmark(discounts_count: int, overlap: float, basket_size: int, cached: bool = False) -> Benchmark:
+    def setup() -> System:
+        system = generate_system(3, 200, discounts_count, overlap)
+        system.add_items_to_basket(generate_basket(4, system, basket_size))
+        system.pricer.reset(list(enumerate(system.discounts)))
+        if not cached:
+            system.pricer.cache.clear()
+        return system
+
+    def run(system: System) -> None:
+        system.apply_best_discount_combination()
+
+    name = f"discounts={discounts_count}/overlap={overlap}/basket={basket_size}"
+    return f"checkout/cached/{name}" if cached else f"checkout/{name}", setup, run
+
+
+def kernel_benchmark(discount_type: str, basket_size: int) -> Benchmark:
+    def setup():
+        system = generate_system(5, 50, 0)
+        items_names = system.get_items_names()
+        match discount_type:
+            case "bundle":
+                discount = BundleDiscount([items_names[:3]], 3, 2)
+            case "progressive":
+                discount = ProgressiveDiscount(items_names[0], 1, 50)
+            case "bulk":
+                discount = BulkDiscount(items_names[0], 3, 5)
+        generator = random.Random(6)
+        system.add_items_to_basket([generator.choice(items_names[:5]) for _ in range(basket_size)])
+        return discount, system.basket.fork()
+
+    def run(state) -> None:
+        discount, basket = state
+        discount.apply_to_basket(basket, 0)
+
+    return f"kernel/{discount_type}/basket={basket_size}", setup, run
+
+
+def receipt_benchmark(basket_size: int) -> Benchmark:
+    def setup() -> System:
+        system = generate_system(7, 200, 6)
+        system.add_items_to_basket(generate_basket(8, system, basket_size))
+        system.apply_best_discount_combination()
+        return system
+
+    def run(system: System) -> None:
+        system.basket.get_receipt_str()
+
+    return f"receipt/basket={basket_size}", setup, run
+
+
+def matrix_benchmark(baskets_count: int) -> Benchmark:
+    def setup():
+        system = generate_system(9, 200, 6, count_basket=True)
+        pricer = MatrixPricer(system.catalog, system.discounts)
+        baskets = [[(item_name, 1) for item_name in generate_basket(seed, system, 20)]
+                   for seed in range(baskets_count)]
+        return pricer, pricer.get_count_matrix(baskets)
+
+    def run(state) -> None:
+        pricer, counts = state
+        pricer.price(counts)
+
+    return f"matrix/baskets={baskets_count}", setup, run
+
+
+def measure_memory(items_count: int, basket_size: int) -> dict[str, float]:
+    tracemalloc.start()
+    catalog = Catalog()
+    catalog.load(Item(f"item{index}", f"category{index % 20}", 10 + index % 500) for index in range(items_count))
+    catalog_memory, _ = tracemalloc.get_traced_memory()
+
+    generator = random.Random(10)
+    items = [catalog.get(f"item{index}") for index in range(min(items_count, 1000))]
+    basket = Basket()
+    for _ in range(basket_size):
+        basket.add_item(generator.choice(items))
+    basket_memory = tracemalloc.get_traced_memory()[0] - catalog_memory
+    tracemalloc.stop()
+    return {"catalog_entry_bytes": catalog_memory / items_count, "basket_line_bytes": basket_memory / basket_size}
+
+
+def check_memory(items_count: int = 1000000, basket_size: int = 200000) -> bool:
+    result = measure_memory(items_count, basket_size)
+    ok = True
+    for metric, target in MEMORY_TARGETS.items():
+        passed = result[metric] <= target
+        ok = ok and passed
+        print(f"{metric:<20} {result[metric]:8.1f} (target {target}) {'ok' if passed else 'FAILED'}")
+    return ok
+
+
+def get_benchmarks(quick: bool = False) -> list[Benchmark]:
+    basket_sizes = [100, 1000] if quick else [100, 1000, 10000]
+    discounts_counts = [3, 6] if quick else [3, 6, 9, 12]
+    benchmarks = [scanning_benchmark(size) for size in basket_sizes]
+    benchmarks += [checkout_benchmark(count, overlap, 200)
+                   for count in discounts_counts for overlap in (0.0, 0.5, 1.0)]
+    benchmarks += [checkout_benchmark(count, 0.5, 200, cached=True) for count in discounts_counts]
+    benchmarks += [kernel_benchmark(discount_type, size)
+                   for discount_type in ("bundle", "progressive", "bulk") for size in basket_sizes]
+    benchmarks += [receipt_benchmark(size) for size in basket_sizes]
+    if np is not None:
+        benchmarks += [matrix_benchmark(size * 10) for size in basket_sizes]
+    return benchmarks
+
+
+def measure(benchmark: Benchmark, repeats: int) -> dict[str, float]:
+    _, setup, run = benchmark
+    times = []
+    for _ in range(repeats):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time": min(times), "median_time": statistics.median(times), "peak_memory": peak_memory}
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]],
+            threshold: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("time", "peak_memory"):
+            old, new = baseline[name][metric], result[metric]
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append(f"{name}: {metric} {old:.6g} -> {new:.6g} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Benchmarks for the pricing hot paths")
+    parser.add_argument("--quick", action="store_true", help="run the smaller sizes only")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--filter", default="", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--save", metavar="FILE", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown or memory growth before reporting a regression")
+    parser.add_argument("--memory", action="store_true",
+                        help="check the bytes per catalog entry and per basket line with 1M products")
+    arguments = parser.parse_args()
+
+    if arguments.memory:
+        sys.exit(0 if check_memory() else 1)
+
+    results = {}
+    for benchmark in get_benchmarks(arguments.quick):
+        name = benchmark[0]
+        if arguments.filter not in name:
+            continue
+        results[name] = measure(benchmark, arguments.repeats)
+        result = results[name]
+        print(f"{name:<55} {result['time'] * 1000:10.3f} ms {result['median_time'] * 1000:10.3f} ms "
+              f"{result['peak_memory'] / 1024:10.1f} KiB")
+
+    if arguments.save is not None:
+        with open(arguments.save, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    if arguments.compare is not None:
+        with open(arguments.compare, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), arguments.threshold)
+        if regressions:
+            print("\nRegressions:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from heapq import merge
+
+from discounts import Discount
+from metrics import registry
+
+Signature = tuple[tuple[str, int, int], ...]
+
+
+def get_signature(lines: dict[str, list[tuple[int, int, int]]]) -> Signature:
+    signature = []
+    for _, quantity, price, name in merge(*([(position, quantity, price, name) for position, quantity, price in runs]
+                                            for name, runs in lines.items())):
+        if signature and signature[-1][0] == name and signature[-1][1] == price:
+            signature[-1][2] += quantity
+        else:
+            signature.append([name, price, quantity])
+    return tuple(tuple(run) for run in signature)
+
+
+class ResultCache:
+    """LRU cache of the best discount sequence of a conflict group.
+
+    Entries are keyed by the discounts of the group and by the run-length
+    encoded (name, price) lines the group can use, in basket order, so equal
+    baskets share entries regardless of where the lines are. Editing or
+    removing a discount drops only the entries of groups that contain it.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_signature_length: int = 1000) -> None:
+        self.max_entries = max_entries
+        self.max_signature_length = max_signature_length
+        self.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def clear(self) -> None:
+        self.entries = OrderedDict()
+        self.keys_by_discount = {}
+
+    def get(self, discounts: tuple[Discount, ...], signature: Signature) -> tuple[int, tuple[int, ...]] | None:
+        key = (discounts, signature)
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            if registry.enabled:
+                registry.increment("cache.misses")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        if registry.enabled:
+            registry.increment("cache.hits")
+        return result
+
+    def put(self, discounts: tuple[Discount, ...], signature: Signature, result: tuple[int, tuple[int, ...]]) -> None:
+        if self.max_entries <= 0 or len(signature) > self.max_signature_length:
+            return
+        key = (discounts, signature)
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        for discount in discounts:
+            self.keys_by_discount.setdefault(discount, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key: tuple[tuple[Discount, ...], Signature]) -> None:
+        del self.entries[key]
+        for discount in key[0]:
+            keys = self.keys_by_discount[discount]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_discount[discount]
+
+    def invalidate(self, discount: Discount) -> None:
+        for key in list(self.keys_by_discount.get(discount, ())):
+            self.remove(key)
+
+    def get_stats(self) -> dict[str, int]:
+        return {"entries": len(self.entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
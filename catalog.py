@@ -0,0 +1,129 @@
+from math import isqrt
+from typing import Iterable, Iterator
+
+from item import Item
+
+MIN_CHANGES_TO_FOLD = 64
+
+
+class CatalogBase:
+    def __init__(self, items_by_name: dict[str, Item]) -> None:
+        self.items_by_name = items_by_name
+        self.names_by_category = None
+
+    def get_names_by_category(self) -> dict[str, list[str]]:
+        if self.names_by_category is None:
+            self.names_by_category = {}
+            for item in self.items_by_name.values():
+                self.names_by_category.setdefault(item.category, []).append(item.name)
+        return self.names_by_category
+
+
+class Catalog:
+    """Catalog whose copies share the items of the version they were copied from.
+
+    The base dict is never changed once a catalog has it. Edits are kept in
+    small overlays: changes maps edited names to their item (None when
+    removed), slots maps base names to the item now at that position, and
+    appended holds items added after the base, in order. A copy copies only
+    the overlays, and once they outgrow the square root of the base the copy
+    folds them into a new base, so an edit costs O(sqrt(n)) amortized.
+    """
+
+    def __init__(self) -> None:
+        self.base = CatalogBase({})
+        self.clear_changes()
+
+    def clear_changes(self) -> None:
+        self.changes = {}
+        self.slots = {}
+        self.slot_by_name = {}
+        self.appended = {}
+        self.count = len(self.base.items_by_name)
+
+    def __contains__(self, item_name: str) -> bool:
+        return self.get(item_name) is not None
+
+    def __iter__(self) -> Iterator[Item]:
+        if not self.changes:
+            return iter(self.base.items_by_name.values())
+        return self.iterate_changed()
+
+    def iterate_changed(self) -> Iterator[Item]:
+        slots = self.slots
+        for name, item in self.base.items_by_name.items():
+            if name in slots:
+                item = slots[name]
+                if item is None:
+                    continue
+            yield item
+        yield from self.appended.values()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, item_name: str) -> Item | None:
+        changes = self.changes
+        if changes and item_name in changes:
+            return changes[item_name]
+        return self.base.items_by_name.get(item_name)
+
+    def get_items_names(self) -> list[str]:
+        if not self.changes:
+            return list(self.base.items_by_name)
+        return [item.name for item in self]
+
+    def get_items_by_category(self, category: str) -> list[Item]:
+        items_by_name = self.base.items_by_name
+        slots = self.slots
+        items = [items_by_name[name] for name in self.base.get_names_by_category().get(category, ())
+                 if name not in slots]
+        items += [item for item in slots.values() if item is not None and item.category == category]
+        items += [item for item in self.appended.values() if item.category == category]
+        return items
+
+    def copy(self) -> "Catalog":
+        catalog = Catalog()
+        if len(self.changes) > max(MIN_CHANGES_TO_FOLD, isqrt(len(self.base.items_by_name))):
+            catalog.load(self)
+            return catalog
+        catalog.base = self.base
+        catalog.changes = dict(self.changes)
+        catalog.slots = dict(self.slots)
+        catalog.slot_by_name = dict(self.slot_by_name)
+        catalog.appended = dict(self.appended)
+        catalog.count = self.count
+        return catalog
+
+    def load(self, items: Iterable[Item]) -> None:
+        self.base = CatalogBase({item.name: item for item in items})
+        self.clear_changes()
+
+    def add(self, item: Item) -> None:
+        self.appended[item.name] = item
+        self.changes[item.name] = item
+        self.count += 1
+
+    def update(self, item_name: str, item: Item) -> None:
+        if item_name in self.appended:
+            if item.name == item_name:
+                self.appended[item_name] = item
+            else:
+                self.appended = {(item.name if name == item_name else name): (item if name == item_name else other)
+                                 for name, other in self.appended.items()}
+        else:
+            slot = self.slot_by_name.pop(item_name, item_name)
+            self.slots[slot] = item
+            if item.name != slot:
+                self.slot_by_name[item.name] = slot
+        if item.name != item_name:
+            self.changes[item_name] = None
+        self.changes[item.name] = item
+
+    def remove(self, item_name: str) -> None:
+        if item_name in self.appended:
+            del self.appended[item_name]
+        else:
+            self.slots[self.slot_by_name.pop(item_name, item_name)] = None
+        self.changes[item_name] = None
+        self.count -= 1
@@ -2,12 +2,15 @@ from textwrap import dedent
 
 from system import System
 from discounts import Discount
+from importer import import_file
 import validation
 
 
 class CLI:
-    def __init__(self) -> None:
-        self.system = System()
+    def __init__(self, count_basket: bool = False, parallel_workers: int | None = None,
+                 budget: float | None = None) -> None:
+        self.system = System(count_basket=count_basket, parallel_workers=parallel_workers, budget=budget)
+        self.budget = budget
 
     def main_menu(self) -> None:
         print("Grocery Store Till System")
@@ -21,6 +24,7 @@ class CLI:
                 1. Begin scanning
                 2. Configure till
                 3. Exit
+                4. Quote a price
             """
             print(dedent(actions_info))
 
@@ -34,17 +38,19 @@ class CLI:
                     self.configure_till()
                 case '3':
                     break
+                case '4':
+                    self.quote_handler()
                 case _:
                     print("Invalid action.\n")
 
         print("Exiting the system...")
 
     def scanning_menu(self) -> None:
-        running_total = 0
+        running_total = discounted_total = 0
         user_action = 0
 
         while user_action != '3':
-            print(f"Running total = {running_total}c")
+            print(f"Running total = {running_total}c, with discounts = {discounted_total}c")
             actions_info = """\
                 Available actions:
                 1. Scan items
@@ -58,7 +64,7 @@ class CLI:
 
             match user_action:
                 case '1':
-                    running_total = self.scan_items()
+                    running_total, discounted_total = self.scan_items()
                 case '2':
                     self.finalize()
                     break
@@ -70,24 +76,58 @@ class CLI:
 
         print("Returning to main menu...\n")
 
-    def scan_items(self) -> int:
-        prompt = "List names of items to scan (separated with commas):"
+    def scan_items(self) -> tuple[int, int]:
+        prompt = "List names of items to scan (separated with commas, \"<name>*<quantity>\" scans several):"
         items = self.get_processed_input(prompt)
-        if validation.validate_items_exist(items, self.system.items):
-            self.system.add_items_to_basket(items)
-        return self.system.basket.get_total_price()
+        counted_items = self.process_counted_items(items)
+        if counted_items is not None:
+            items_names = [item_name for item_name, _ in counted_items]
+            if validation.validate_items_exist(items_names, self.system.catalog):
+                self.system.add_counted_items_to_basket(counted_items)
+        return self.system.basket.get_total_price(), self.system.get_discounted_total()
+
+    def process_counted_items(self, items: list[str]) -> list[tuple[str, int]] | None:
+        counted_items = []
+        for item in items:
+            item_name, separator, quantity = item.partition('*')
+            if not separator:
+                counted_items.append((item_name, 1))
+                continue
+            quantity = quantity.strip()
+            if not validation.validate_item_quantity(quantity):
+                return None
+            counted_items.append((item_name.strip(), int(quantity)))
+        return counted_items
 
     def finalize(self) -> None:
-        if not self.system.basket.items:
+        if self.system.basket.is_empty():
             print("The basket is empty.\n")
             input("Proceed...")
             return
         self.system.apply_best_discount_combination()
         self.system.view_discounts()
         print(self.system.basket.get_receipt_str())
+        if self.budget is not None:
+            if self.system.pricer.is_proven():
+                print("Best discounts found within the time budget, proven optimal.\n")
+            else:
+                print(f"Best discounts found within the time budget, not proven optimal, "
+                      f"at most {self.system.pricer.get_gap()}c above the best possible price.\n")
+        self.system.record_checkout()
         self.system.empty_basket()
         input("Proceed...")
 
+    def quote_handler(self) -> None:
+        prompt = "Please enter item name and quantity, separated with commas:\n"
+        quote_input = self.get_processed_input(prompt)
+        if validation.validate_minimum_number_of_arguments(quote_input, 2):
+            item_name, quantity = quote_input[:2]
+            result = self.system.quote(item_name, quantity)
+            if result is not None:
+                total, discounted_total = result
+                print(f"{quantity} x {item_name} = {total}c, with discounts = {discounted_total}c\n")
+        input("Proceed...")
+
     def discard(self) -> None:
         print("Emptying basket...\n")
         self.system.empty_basket()
@@ -113,6 +153,7 @@ class CLI:
                 8. Remove a discount
                 
                 9. Return to main menu
+                10. Import products and discounts from a file
                 """
             print(dedent(actions_info))
             user_action = input("Please choose an action (using numbers):")
@@ -137,6 +178,8 @@ class CLI:
                 case '9':
                     print("Returning to main menu...")
                     break
+                case '10':
+                    self.import_handler()
                 case _:
                     print("Invalid action.\n")
             input("Proceed...")
@@ -339,6 +382,10 @@ class CLI:
             self.system.remove_discount(index)
         print("Discount removed successfully.")
 
+    def import_handler(self) -> None:
+        path = input("Please enter the path of a JSON, JSONL or CSV file:").strip()
+        print(import_file(self.system, path).get_text())
+
     def select_discount_by_index(self) -> tuple[Discount, int] | None:
         discount_number = input("Please enter active discount number:")
         discount_number = discount_number.strip()
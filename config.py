@@ -0,0 +1,21 @@
+from importer import import_file
+from store import Store
+from system import System
+
+
+def load_configuration(system: System, path: str) -> bool:
+    report = import_file(system, path)
+    if not report.is_ok():
+        print(report.get_text(), end="")
+    return report.is_ok()
+
+
+def load_system(config_path: str | None, store_path: str | None) -> System | None:
+    system = System(count_basket=True)
+    if store_path is not None:
+        store = Store(store_path)
+        system.load(store.load_items(), store.load_discounts())
+        store.close()
+    if config_path is not None and not load_configuration(system, config_path):
+        return None
+    return system
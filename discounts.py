@@ -1,6 +1,27 @@
 from abc import ABC, abstractmethod
+from heapq import merge
+from itertools import repeat
+from typing import Iterator
 
-from basket import Basket
+from basket import Basket, CountBasket
+from metrics import instrumented
+
+
+def get_basket_attributes(discount: "Discount", basket: Basket, *_) -> dict[str, float]:
+    return {"basket_size": basket.get_size()}
+
+
+def get_remaining_runs(runs: list[tuple[int, int, int]], consumed: int) -> Iterator[tuple[int, int, int]]:
+    for position, quantity, price in runs:
+        if consumed >= quantity:
+            consumed -= quantity
+            continue
+        yield position + consumed, quantity - consumed, price
+        consumed = 0
+
+
+def get_remaining_quantity(runs: list[tuple[int, int, int]], consumed: int) -> int:
+    return sum(quantity for _, quantity, _ in runs) - consumed
 
 
 class Discount(ABC):
@@ -8,6 +29,10 @@ class Discount(ABC):
     def apply_to_basket(self, basket: Basket, discount_id: int) -> None:
         pass
 
+    @abstractmethod
+    def apply_to_count_basket(self, basket: CountBasket, discount_id: int) -> None:
+        pass
+
     @abstractmethod
     def get_info_str(self) -> str:
         pass
@@ -20,6 +45,18 @@ class Discount(ABC):
     def update_info_from_list(self, item_data: str | list[list[str]] | None, numeric_data: list[int | None]) -> None:
         pass
 
+    @abstractmethod
+    def get_items_names(self) -> frozenset[str]:
+        pass
+
+    @abstractmethod
+    def get_data(self) -> dict:
+        pass
+
+    @abstractmethod
+    def apply_to_counts(self, lines: dict[str, list[tuple[int, int, int]]], consumed: dict[str, int]) -> int | None:
+        pass
+
 
 class BundleDiscount(Discount):
     def __init__(self,
@@ -29,9 +66,15 @@ class BundleDiscount(Discount):
         self.bundles = bundles
         self.threshold = threshold
         self.quantity_to_pay = quantity_to_pay
+        self.compile()
+
+    def compile(self) -> None:
+        self.bundle_sets = [frozenset(bundle) for bundle in self.bundles]
+        self.items_names = frozenset().union(*self.bundle_sets)
 
+    @instrumented("discount.bundle.apply_to_basket", get_basket_attributes)
     def apply_to_basket(self, basket: Basket, discount_id: int) -> None:
-        for bundle in self.bundles:
+        for bundle in self.bundle_sets:
             eligible_items_indices = self.get_eligible_items_indices(
                 basket, bundle)
             if not eligible_items_indices:
@@ -39,22 +82,68 @@ class BundleDiscount(Discount):
             self.discount_items(
                 basket, eligible_items_indices, bundle, discount_id)
 
-    def get_eligible_items_indices(self, basket: Basket, bundle: list[str] | str) -> list[int]:
-        return [index for (index, item) in enumerate(basket.items) if item.name in bundle and item.applied_discount_id is None]
+    def get_eligible_items_indices(self, basket: Basket, bundle: frozenset[str]) -> list[int]:
+        indices = [basket.indices_by_name[name] for name in bundle if name in basket.indices_by_name]
+        applied_discount_ids = basket.applied_discount_ids
+        return [index for index in (indices[0] if len(indices) == 1 else merge(*indices))
+                if applied_discount_ids[index] is None]
 
-    def discount_items(self, basket: Basket, eligible_indices: list[int], bundle: list[str] | str, discount_id: int) -> None:
+    def discount_items(self, basket: Basket, eligible_indices: list[int], bundle: frozenset[str], discount_id: int) -> None:
         if len(eligible_indices) < self.threshold:
             return
         candidates = eligible_indices[:self.threshold]
-        candidates.sort(key=lambda index: basket.items[index].normal_price)
+        candidates.sort(key=lambda index: basket.get_item(index).normal_price)
         quantity_to_discount = self.threshold - self.quantity_to_pay
         cheapest = candidates[:quantity_to_discount]
-        basket_size = len(basket.items)
-        for index in range(basket_size):
-            if index in candidates:
-                basket.items[index].applied_discount_id = discount_id
-            if index in cheapest:
-                basket.items[index].discounted_price = 0
+        for index in candidates:
+            basket.applied_discount_ids[index] = discount_id
+        for index in cheapest:
+            basket.discounted_prices[index] = 0
+
+    @instrumented("discount.bundle.apply_to_count_basket", get_basket_attributes)
+    def apply_to_count_basket(self, basket: CountBasket, discount_id: int) -> None:
+        for bundle in self.bundle_sets:
+            eligible_lines = basket.get_eligible_lines(bundle)
+            eligible_quantity = sum(line.quantity for line in eligible_lines)
+            if not eligible_lines or eligible_quantity < self.threshold:
+                continue
+            candidates = basket.take_units(eligible_lines, self.threshold)
+            for line in candidates:
+                line.applied_discount_id = discount_id
+            candidates.sort(key=lambda line: line.item.normal_price)
+            quantity_to_discount = len(
+                range(self.threshold)[:self.threshold - self.quantity_to_pay])
+            for line in basket.take_units(candidates, quantity_to_discount):
+                line.discounted_price = 0
+
+    def get_items_names(self) -> frozenset[str]:
+        return self.items_names
+
+    def apply_to_counts(self, lines: dict[str, list[tuple[int, int, int]]], consumed: dict[str, int]) -> int | None:
+        price_change = None
+        for bundle in self.bundle_sets:
+            remaining = [zip(get_remaining_runs(lines.get(name, []), consumed.get(name, 0)), repeat(name))
+                         for name in bundle]
+            eligible = []
+            needed = self.threshold
+            for (_, quantity, price), name in merge(*remaining):
+                if needed == 0:
+                    break
+                taken = min(quantity, needed)
+                eligible.append((price, taken, name))
+                needed -= taken
+            if not eligible or needed:
+                continue
+            quantity_to_discount = len(range(self.threshold)[:self.threshold - self.quantity_to_pay])
+            discount = 0
+            for price, taken, _ in sorted(eligible, key=lambda run: run[0]):
+                discounted = min(taken, quantity_to_discount)
+                discount += discounted * price
+                quantity_to_discount -= discounted
+            for _, taken, name in eligible:
+                consumed[name] = consumed.get(name, 0) + taken
+            price_change = (price_change or 0) - discount
+        return price_change
 
     def get_info_str(self) -> str:
         info = f"Bundle Discount: {self.threshold} for {self.quantity_to_pay} on {self.bundles[0]}"
@@ -66,6 +155,10 @@ class BundleDiscount(Discount):
     def get_type(self) -> str:
         return "bundle"
 
+    def get_data(self) -> dict:
+        return {"type": self.get_type(), "threshold": self.threshold,
+                "quantity_to_pay": self.quantity_to_pay, "bundles": self.bundles}
+
     def update_info_from_list(self, item_data: str | list[list[str]] | None, numeric_data: list[int | None]) -> None:
         new_bundles = item_data
         new_threshold, new_quantity_to_pay = numeric_data
@@ -75,6 +168,7 @@ class BundleDiscount(Discount):
             self.threshold = new_threshold
         if new_quantity_to_pay is not None:
             self.quantity_to_pay = new_quantity_to_pay
+        self.compile()
 
 
 class ProgressiveDiscount(Discount):
@@ -85,7 +179,12 @@ class ProgressiveDiscount(Discount):
         self.item = item
         self.threshold = threshold
         self.percentage_off_next = percentage_off_next
+        self.compile()
+
+    def compile(self) -> None:
+        self.items_names = frozenset([self.item])
 
+    @instrumented("discount.progressive.apply_to_basket", get_basket_attributes)
     def apply_to_basket(self, basket: Basket, discount_id: int) -> None:
         eligible_items_indices = self.get_eligible_items_indices(basket)
         if not eligible_items_indices:
@@ -93,7 +192,9 @@ class ProgressiveDiscount(Discount):
         self.discount_items(basket, eligible_items_indices, discount_id)
 
     def get_eligible_items_indices(self, basket: Basket) -> list[int]:
-        return [index for (index, item) in enumerate(basket.items) if item.name == self.item and item.applied_discount_id is None]
+        applied_discount_ids = basket.applied_discount_ids
+        return [index for index in basket.indices_by_name.get(self.item, ())
+                if applied_discount_ids[index] is None]
 
     def discount_items(self, basket: Basket, eligible_indices: list[int], discount_id: int) -> None:
         candidate_group_size = self.threshold + 1
@@ -103,14 +204,51 @@ class ProgressiveDiscount(Discount):
         candidates_count = candidate_groups_count * candidate_group_size
         candidates = eligible_indices[:candidates_count]
         items_to_discount = candidates[:candidate_groups_count]
-        basket_size = len(basket.items)
-        for index in range(basket_size):
-            if index in candidates:
-                basket.items[index].applied_discount_id = discount_id
-            if index in items_to_discount:
-                price = basket.items[index].normal_price
-                basket.items[index].discounted_price = price - \
-                    round((self.percentage_off_next/100)*price)
+        for index in candidates:
+            basket.applied_discount_ids[index] = discount_id
+        for index in items_to_discount:
+            price = basket.get_item(index).normal_price
+            basket.discounted_prices[index] = price - \
+                round((self.percentage_off_next/100)*price)
+
+    @instrumented("discount.progressive.apply_to_count_basket", get_basket_attributes)
+    def apply_to_count_basket(self, basket: CountBasket, discount_id: int) -> None:
+        eligible_lines = basket.get_eligible_lines(self.item)
+        eligible_quantity = sum(line.quantity for line in eligible_lines)
+        candidate_group_size = self.threshold + 1
+        if eligible_quantity < candidate_group_size:
+            return
+        candidate_groups_count = eligible_quantity // candidate_group_size
+        candidates_count = candidate_groups_count * candidate_group_size
+        candidates = basket.take_units(eligible_lines, candidates_count)
+        for line in candidates:
+            line.applied_discount_id = discount_id
+        for line in basket.take_units(candidates, candidate_groups_count):
+            price = line.item.normal_price
+            line.discounted_price = price - \
+                round((self.percentage_off_next/100)*price)
+
+    def get_items_names(self) -> frozenset[str]:
+        return self.items_names
+
+    def apply_to_counts(self, lines: dict[str, list[tuple[int, int, int]]], consumed: dict[str, int]) -> int | None:
+        already_consumed = consumed.get(self.item, 0)
+        runs = lines.get(self.item, [])
+        remaining_quantity = get_remaining_quantity(runs, already_consumed)
+        candidate_group_size = self.threshold + 1
+        if remaining_quantity < candidate_group_size:
+            return None
+        candidate_groups_count = remaining_quantity // candidate_group_size
+        consumed[self.item] = already_consumed + \
+            candidate_groups_count * candidate_group_size
+        price_change = 0
+        for _, quantity, price in get_remaining_runs(runs, already_consumed):
+            if candidate_groups_count == 0:
+                break
+            discounted = min(quantity, candidate_groups_count)
+            price_change -= discounted * round((self.percentage_off_next/100)*price)
+            candidate_groups_count -= discounted
+        return price_change
 
     def get_info_str(self) -> str:
         return f"Progressive Discount: Buy {self.threshold} Get 1 at {self.percentage_off_next}% off on \"{self.item}\""
@@ -118,6 +256,10 @@ class ProgressiveDiscount(Discount):
     def get_type(self) -> str:
         return "progressive"
 
+    def get_data(self) -> dict:
+        return {"type": self.get_type(), "threshold": self.threshold,
+                "percentage_off_next": self.percentage_off_next, "item": self.item}
+
     def update_info_from_list(self, item_data: str | list[list[str]] | None, numeric_data: list[int | None]) -> None:
         if item_data is not None:
             self.item = item_data
@@ -127,6 +269,7 @@ class ProgressiveDiscount(Discount):
             self.threshold = new_threshold
         if new_percentage is not None:
             self.percentage_off_next = new_percentage
+        self.compile()
 
 
 class BulkDiscount(Discount):
@@ -137,7 +280,12 @@ class BulkDiscount(Discount):
         self.item = item
         self.threshold = threshold
         self.new_price = new_price
+        self.compile()
+
+    def compile(self) -> None:
+        self.items_names = frozenset([self.item])
 
+    @instrumented("discount.bulk.apply_to_basket", get_basket_attributes)
     def apply_to_basket(self, basket: Basket, discount_id: int) -> None:
         eligible_items_indices = self.get_eligible_items_indices(basket)
         if not eligible_items_indices:
@@ -145,16 +293,39 @@ class BulkDiscount(Discount):
         self.discount_items(basket, eligible_items_indices, discount_id)
 
     def get_eligible_items_indices(self, basket: Basket) -> list[int]:
-        return [index for (index, item) in enumerate(basket.items) if item.name == self.item and item.applied_discount_id is None]
+        applied_discount_ids = basket.applied_discount_ids
+        return [index for index in basket.indices_by_name.get(self.item, ())
+                if applied_discount_ids[index] is None]
 
     def discount_items(self, basket: Basket, eligible_indices: list[int], discount_id: int) -> None:
         if len(eligible_indices) < self.threshold:
             return
-        basket_size = len(basket.items)
-        for index in range(basket_size):
-            if index in eligible_indices:
-                basket.items[index].applied_discount_id = discount_id
-                basket.items[index].discounted_price = self.new_price
+        for index in eligible_indices:
+            basket.applied_discount_ids[index] = discount_id
+            basket.discounted_prices[index] = self.new_price
+
+    @instrumented("discount.bulk.apply_to_count_basket", get_basket_attributes)
+    def apply_to_count_basket(self, basket: CountBasket, discount_id: int) -> None:
+        eligible_lines = basket.get_eligible_lines(self.item)
+        eligible_quantity = sum(line.quantity for line in eligible_lines)
+        if not eligible_lines or eligible_quantity < self.threshold:
+            return
+        for line in eligible_lines:
+            line.applied_discount_id = discount_id
+            line.discounted_price = self.new_price
+
+    def get_items_names(self) -> frozenset[str]:
+        return self.items_names
+
+    def apply_to_counts(self, lines: dict[str, list[tuple[int, int, int]]], consumed: dict[str, int]) -> int | None:
+        already_consumed = consumed.get(self.item, 0)
+        runs = lines.get(self.item, [])
+        remaining_quantity = get_remaining_quantity(runs, already_consumed)
+        if not remaining_quantity or remaining_quantity < self.threshold:
+            return None
+        consumed[self.item] = already_consumed + remaining_quantity
+        return sum(quantity * (self.new_price - price)
+                   for _, quantity, price in get_remaining_runs(runs, already_consumed))
 
     def get_info_str(self) -> str:
         return f"Bulk Purchase: {self.threshold} or more \"{self.item}\" for {self.new_price}c each"
@@ -162,6 +333,10 @@ class BulkDiscount(Discount):
     def get_type(self) -> str:
         return "bulk"
 
+    def get_data(self) -> dict:
+        return {"type": self.get_type(), "threshold": self.threshold,
+                "new_price": self.new_price, "item": self.item}
+
     def update_info_from_list(self, item_data: str | list[list[str]] | None, numeric_data: list[int | None]) -> None:
         if item_data is not None:
             self.item = item_data
@@ -171,3 +346,16 @@ class BulkDiscount(Discount):
             self.threshold = new_threshold
         if new_discounted_price is not None:
             self.new_price = new_discounted_price
+        self.compile()
+
+
+def create_discount(data: dict) -> Discount:
+    match data["type"]:
+        case "bundle":
+            return BundleDiscount(data["bundles"], data["threshold"], data["quantity_to_pay"])
+        case "progressive":
+            return ProgressiveDiscount(data["item"], data["threshold"], data["percentage_off_next"])
+        case "bulk":
+            return BulkDiscount(data["item"], data["threshold"], data["new_price"])
+        case _:
+            raise ValueError(f"Unknown discount type \"{data['type']}\"")
@@ -0,0 +1,351 @@
+import json
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from copy import deepcopy
+from itertools import permutations
+from typing import Any, Callable, Iterator
+
+from basket import Basket
+from catalog import Catalog
+from importer import create_discount_from_record
+from item import Item
+from matrix import MatrixPricer, np
+from parallel import ParallelSolver
+from system import System
+
+Case = dict[str, Any]
+Result = tuple[int, list[tuple[str, int, int | None, int | None]] | None]
+Engine = tuple[Callable[[Case], Result], bool]
+
+
+def generate_case(seed: int, max_items: int = 5, max_discounts: int = 6, max_basket_size: int = 14) -> Case:
+    generator = random.Random(seed)
+    names = [f"p{index}" for index in range(generator.randint(1, max_items))]
+    items = [{"name": name, "category": generator.choice(["a", "b"]),
+              "price": generator.choice([1, 10, 25, 40, 50, 99])} for name in names]
+    discounts = []
+    for _ in range(generator.randint(0, max_discounts)):
+        match generator.choice(["bundle", "progressive", "bulk"]):
+            case "bundle":
+                threshold = generator.randint(0, 4)
+                discounts.append({"type": "bundle", "threshold": threshold,
+                                  "quantity_to_pay": generator.randint(0, threshold + 1),
+                                  "bundles": [generator.sample(names, generator.randint(1, min(3, len(names))))
+                                              for _ in range(generator.randint(1, 2))]})
+            case "progressive":
+                discounts.append({"type": "progressive", "threshold": generator.randint(0, 3),
+                                  "percentage_off_next": generator.randint(0, 100), "item": generator.choice(names)})
+            case "bulk":
+                discounts.append({"type": "bulk", "threshold": generator.randint(0, 4),
+                                  "new_price": generator.choice([0, 5, 20, 45, 60]), "item": generator.choice(names)})
+    basket = [generator.choice(names) for _ in range(generator.randint(0, max_basket_size))]
+    return {"items": items, "discounts": discounts, "basket": basket}
+
+
+def get_items(case: Case) -> list[Item]:
+    return [Item(record["name"], record["category"], record["price"]) for record in case["items"]]
+
+
+def get_basket_result(basket: Basket) -> Result:
+    lines = [(name, normal_price, discounted_price, applied_discount_id)
+             for (name, _, normal_price, discounted_price, applied_discount_id), quantity in basket.get_receipt_lines()
+             for _ in range(quantity)]
+    return basket.get_discounted_price(), lines
+
+
+class OracleUnit:
+    def __init__(self, item: Item) -> None:
+        self.name = item.name
+        self.normal_price = item.normal_price
+        self.discounted_price = None
+        self.applied_discount_id = None
+
+
+class OracleBasket:
+    """Frozen copy of the original basket and discount kernels, one unit per
+    scanned item, so the engines are never checked against code they share.
+    """
+
+    def __init__(self, units: list[OracleUnit]) -> None:
+        self.items = units
+
+    def get_discounted_price(self) -> int:
+        return sum(item.discounted_price if item.discounted_price is not None else item.normal_price
+                   for item in self.items)
+
+    def apply_discount(self, record: dict, discount_id: int) -> None:
+        match record["type"]:
+            case "bundle":
+                for bundle in record["bundles"]:
+                    eligible_indices = self.get_eligible_items_indices(bundle)
+                    if eligible_indices:
+                        self.apply_bundle(eligible_indices, record["threshold"], record["quantity_to_pay"], discount_id)
+            case "progressive":
+                eligible_indices = self.get_eligible_items_indices([record["item"]])
+                if eligible_indices:
+                    self.apply_progressive(eligible_indices, record["threshold"], record["percentage_off_next"],
+                                           discount_id)
+            case "bulk":
+                eligible_indices = self.get_eligible_items_indices([record["item"]])
+                if eligible_indices:
+                    self.apply_bulk(eligible_indices, record["threshold"], record["new_price"], discount_id)
+
+    def get_eligible_items_indices(self, names: list[str]) -> list[int]:
+        return [index for (index, item) in enumerate(self.items)
+                if item.name in names and item.applied_discount_id is None]
+
+    def apply_bundle(self, eligible_indices: list[int], threshold: int, quantity_to_pay: int,
+                     discount_id: int) -> None:
+        if len(eligible_indices) < threshold:
+            return
+        candidates = eligible_indices[:threshold]
+        candidates.sort(key=lambda index: self.items[index].normal_price)
+        cheapest = candidates[:threshold - quantity_to_pay]
+        for index in range(len(self.items)):
+            if index in candidates:
+                self.items[index].applied_discount_id = discount_id
+            if index in cheapest:
+                self.items[index].discounted_price = 0
+
+    def apply_progressive(self, eligible_indices: list[int], threshold: int, percentage_off_next: int,
+                          discount_id: int) -> None:
+        candidate_group_size = threshold + 1
+        if len(eligible_indices) < candidate_group_size:
+            return
+        candidate_groups_count = len(eligible_indices) // candidate_group_size
+        candidates = eligible_indices[:candidate_groups_count * candidate_group_size]
+        items_to_discount = candidates[:candidate_groups_count]
+        for index in range(len(self.items)):
+            if index in candidates:
+                self.items[index].applied_discount_id = discount_id
+            if index in items_to_discount:
+                price = self.items[index].normal_price
+                self.items[index].discounted_price = price - round((percentage_off_next/100)*price)
+
+    def apply_bulk(self, eligible_indices: list[int], threshold: int, new_price: int, discount_id: int) -> None:
+        if len(eligible_indices) < threshold:
+            return
+        for index in range(len(self.items)):
+            if index in eligible_indices:
+                self.items[index].applied_discount_id = discount_id
+                self.items[index].discounted_price = new_price
+
+
+def price_with_oracle(case: Case, basket_names: list[str]) -> Result:
+    """Applies every order of the discounts to a deep copy of the basket and
+    keeps the first cheapest one, like the original system did.
+    """
+    items = {item.name: item for item in get_items(case)}
+    basket = OracleBasket([OracleUnit(items[name]) for name in basket_names])
+    baskets = []
+    for sequence in permutations(enumerate(case["discounts"])):
+        candidate = deepcopy(basket)
+        for discount_id, record in sequence:
+            candidate.apply_discount(record, discount_id)
+        baskets.append(candidate)
+    basket = min(baskets, key=lambda candidate: candidate.get_discounted_price())
+    return basket.get_discounted_price(), [(item.name, item.normal_price, item.discounted_price,
+                                            item.applied_discount_id) for item in basket.items]
+
+
+class SystemEngine:
+    def __init__(self, system: System) -> None:
+        self.system = system
+
+    def __call__(self, case: Case) -> Result:
+        system = self.system
+        system.load(get_items(case), [create_discount_from_record(record) for record in case["discounts"]])
+        system.empty_basket()
+        for name in case["basket"]:
+            system.add_items_to_basket([name])
+        system.apply_best_discount_combination()
+        return get_basket_result(system.basket)
+
+    def close(self) -> None:
+        if isinstance(self.system.solver, ParallelSolver):
+            self.system.solver.close()
+
+
+def price_with_matrix(case: Case) -> Result:
+    catalog = Catalog()
+    catalog.load(get_items(case))
+    pricer = MatrixPricer(catalog, [create_discount_from_record(record) for record in case["discounts"]])
+    _, discounted_totals = pricer.price(pricer.get_count_matrix([[(name, 1) for name in case["basket"]]]))
+    return int(discounted_totals[0]), None
+
+
+def get_engines(names: list[str]) -> dict[str, Engine]:
+    engines = {}
+    for name in names:
+        match name:
+            case "solver":
+                engines[name] = SystemEngine(System()), False
+            case "count":
+                engines[name] = SystemEngine(System(count_basket=True)), False
+            case "anytime":
+                engines[name] = SystemEngine(System(budget=10.0)), False
+            case "parallel":
+                system = System()
+                system.solver = system.pricer.solver = ParallelSolver(2, min_group_size=2)
+                engines[name] = SystemEngine(system), False
+            case "matrix":
+                if np is None:
+                    raise ValueError("the matrix engine requires numpy")
+                engines[name] = price_with_matrix, True
+            case _:
+                raise ValueError(f"unknown engine \"{name}\"")
+    return engines
+
+
+def close_engines(engines: dict[str, Engine]) -> None:
+    for price, _ in engines.values():
+        if isinstance(price, SystemEngine):
+            price.close()
+
+
+def compare_case(case: Case, engines: dict[str, Engine],
+                 timings: dict[str, list[float]] | None = None) -> dict[str, tuple[Result, Any]]:
+    """Prices the case with the oracle and every engine and returns the
+    expected and actual result of each engine that disagrees with the oracle.
+
+    Engines that take the units in catalog order, like the matrix engine, are
+    compared with the oracle on the same units in that order and by total only.
+    """
+    expected = {}
+    failures = {}
+    for name, (price, catalog_order) in engines.items():
+        if catalog_order not in expected:
+            basket_names = case["basket"]
+            if catalog_order:
+                positions = {record["name"]: position for position, record in enumerate(case["items"])}
+                basket_names = sorted(basket_names, key=positions.get)
+            start = time.perf_counter()
+            result = price_with_oracle(case, basket_names)
+            expected[catalog_order] = result, time.perf_counter() - start
+        expected_result, oracle_time = expected[catalog_order]
+
+        start = time.perf_counter()
+        try:
+            actual = price(case)
+        except Exception as error:
+            actual = f"{type(error).__name__}: {error}"
+        engine_time = time.perf_counter() - start
+        if timings is not None:
+            timing = timings.setdefault(name, [0.0, 0.0])
+            timing[0] += oracle_time
+            timing[1] += engine_time
+
+        if isinstance(actual, str) or actual[0] != expected_result[0] or \
+                actual[1] is not None and actual[1] != expected_result[1]:
+            failures[name] = expected_result, actual
+    return failures
+
+
+def get_smaller_cases(case: Case) -> Iterator[Case]:
+    discounts = case["discounts"]
+    basket = case["basket"]
+    for index in range(len(discounts)):
+        yield {**case, "discounts": discounts[:index] + discounts[index + 1:]}
+    for index in range(len(basket)):
+        yield {**case, "basket": basket[:index] + basket[index + 1:]}
+
+    used_names = set(basket)
+    for record in discounts:
+        if record["type"] == "bundle":
+            used_names.update(name for bundle in record["bundles"] for name in bundle)
+        else:
+            used_names.add(record["item"])
+    items = [record for record in case["items"] if record["name"] in used_names]
+    if len(items) < len(case["items"]):
+        yield {**case, "items": items}
+
+    for index, record in enumerate(discounts):
+        for field in ("threshold", "quantity_to_pay", "percentage_off_next", "new_price"):
+            for value in sorted({0, record.get(field, 0) // 2, record.get(field, 0) - 1}):
+                if 0 <= value < record.get(field, 0):
+                    yield {**case, "discounts": discounts[:index] + [{**record, field: value}] + discounts[index + 1:]}
+        if record["type"] == "bundle":
+            bundles = record["bundles"]
+            for position, bundle in enumerate(bundles):
+                smaller_bundles = [bundles[:position] + bundles[position + 1:]] if len(bundles) > 1 else []
+                smaller_bundles += [bundles[:position] + [bundle[:name_position] + bundle[name_position + 1:]]
+                                    + bundles[position + 1:]
+                                    for name_position in range(len(bundle)) if len(bundle) > 1]
+                for smaller in smaller_bundles:
+                    yield {**case, "discounts": discounts[:index] + [{**record, "bundles": smaller}]
+                                                + discounts[index + 1:]}
+
+    for index, record in enumerate(case["items"]):
+        for value in sorted({0, record["price"] // 2, record["price"] - 1}):
+            if 0 <= value < record["price"]:
+                yield {**case, "items": case["items"][:index] + [{**record, "price": value}] + case["items"][index + 1:]}
+
+
+def shrink(case: Case, fails: Callable[[Case], bool]) -> Case:
+    changed = True
+    while changed:
+        changed = False
+        for smaller in get_smaller_cases(case):
+            if fails(smaller):
+                case, changed = smaller, True
+                break
+    return case
+
+
+def report_failure(name: str, case: Case, engines: dict[str, Engine]) -> None:
+    engine = {name: engines[name]}
+    case = shrink(case, lambda candidate: name in compare_case(candidate, engine))
+    expected, actual = compare_case(case, engine)[name]
+    print(f"\n{name} disagrees with the oracle, minimal case:")
+    print(json.dumps(case))
+    print(f"expected: {json.dumps(expected)}")
+    print(f"actual:   {json.dumps(actual)}")
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Differential fuzzing of the pricing engines against the permutation search")
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first case")
+    parser.add_argument("--engines", default="solver,count,anytime,parallel" + (",matrix" if np is not None else ""),
+                        help="comma separated engines to check: solver, count, anytime, parallel, matrix")
+    parser.add_argument("--max-items", type=int, default=5)
+    parser.add_argument("--max-discounts", type=int, default=6)
+    parser.add_argument("--max-basket-size", type=int, default=14)
+    parser.add_argument("--replay", metavar="FILE", help="check a single case saved as JSON")
+    arguments = parser.parse_args()
+
+    try:
+        engines = get_engines(arguments.engines.split(","))
+    except ValueError as error:
+        parser.error(str(error))
+
+    if arguments.replay is not None:
+        with open(arguments.replay, encoding="utf-8") as case_file:
+            cases = [json.load(case_file)]
+    else:
+        cases = (generate_case(seed, arguments.max_items, arguments.max_discounts, arguments.max_basket_size)
+                 for seed in range(arguments.seed, arguments.seed + arguments.cases))
+
+    timings = {}
+    failures_count = {name: 0 for name in engines}
+    try:
+        for case in cases:
+            for name in compare_case(case, engines, timings):
+                failures_count[name] += 1
+                if failures_count[name] == 1:
+                    report_failure(name, case, engines)
+    finally:
+        close_engines(engines)
+
+    print()
+    for name, (oracle_time, engine_time) in timings.items():
+        print(f"{name:<10} {failures_count[name]:6d} mismatches  oracle {oracle_time:8.3f} s  "
+              f"engine {engine_time:8.3f} s  {oracle_time / engine_time if engine_time else 0:8.1f}x")
+    if any(failures_count.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import csv
+import json
+from typing import Any, Iterable, Iterator
+
+from discounts import Discount, BundleDiscount, ProgressiveDiscount, BulkDiscount
+from item import Item
+from system import System
+
+
+class ImportReport:
+    def __init__(self) -> None:
+        self.items_count = 0
+        self.discounts_count = 0
+        self.errors = []
+
+    def add_error(self, record_number: int, message: str) -> None:
+        self.errors.append({"record": record_number, "error": message})
+
+    def is_ok(self) -> bool:
+        return not self.errors
+
+    def get_data(self) -> dict[str, Any]:
+        return {"ok": self.is_ok(), "items": self.items_count,
+                "discounts": self.discounts_count, "errors": self.errors}
+
+    def get_text(self) -> str:
+        if self.is_ok():
+            return f"Imported {self.items_count} items and {self.discounts_count} discounts.\n"
+        lines = [f"Import failed with {len(self.errors)} errors, nothing was imported:"]
+        lines += [f"record {error['record']}: {error['error']}" for error in self.errors]
+        return "\n".join(lines) + "\n"
+
+
+class InvalidRecord:
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+
+def read_records(path: str) -> Iterator[dict[str, Any] | InvalidRecord]:
+    with open(path, encoding="utf-8", newline="") as import_file:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(import_file):
+                record = {field: value for field, value in row.items() if value not in (None, "")}
+                if "bundles" in record:
+                    try:
+                        record["bundles"] = json.loads(record["bundles"])
+                    except json.JSONDecodeError as error:
+                        yield InvalidRecord(f"invalid bundles JSON: {error}")
+                        continue
+                yield record
+        elif path.endswith(".jsonl"):
+            for line in import_file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as error:
+                        yield InvalidRecord(f"invalid JSON: {error}")
+        else:
+            configuration = json.load(import_file)
+            if not isinstance(configuration, dict):
+                raise ValueError("the configuration is not an object")
+            for field in ("items", "discounts"):
+                if not isinstance(configuration.get(field, []), list):
+                    raise ValueError(f"\"{field}\" is not a list")
+            for item in configuration.get("items", []):
+                yield {"type": "item", **item} if isinstance(item, dict) else item
+            yield from configuration.get("discounts", [])
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, int) and value >= 0 or isinstance(value, str) and value.isnumeric()
+
+
+def get_item_error(record: dict[str, Any], items_names: set[str]) -> str | None:
+    name = record.get("name")
+    if not isinstance(name, str) or not name:
+        return "missing item name"
+    if name in items_names:
+        return f"item \"{name}\" already exists"
+    if not is_number(record.get("price")):
+        return f"invalid price for item \"{name}\""
+    if not isinstance(record.get("category"), str) or not record["category"]:
+        return f"invalid category for item \"{name}\""
+    return None
+
+
+def get_discount_error(record: dict[str, Any]) -> str | None:
+    fields = {"bundle": "quantity_to_pay", "progressive": "percentage_off_next", "bulk": "new_price"}
+    if record.get("type") not in fields:
+        return f"unknown record type \"{record.get('type')}\""
+    for field in ("threshold", fields[record["type"]]):
+        if not is_number(record.get(field)):
+            return f"invalid {field} for {record['type']} discount"
+    if record["type"] == "progressive" and not 0 <= int(record["percentage_off_next"]) <= 100:
+        return "invalid percentage_off_next for progressive discount"
+    if record["type"] == "bundle":
+        bundles = record.get("bundles")
+        if not isinstance(bundles, list) or not bundles or \
+                not all(isinstance(bundle, list) and bundle and all(isinstance(name, str) for name in bundle)
+                        for bundle in bundles):
+            return "invalid bundles for bundle discount"
+    elif not isinstance(record.get("item"), str):
+        return f"missing item for {record['type']} discount"
+    return None
+
+
+def create_discount_from_record(record: dict[str, Any]) -> Discount:
+    match record["type"]:
+        case "bundle":
+            return BundleDiscount(record["bundles"], int(record["threshold"]), int(record["quantity_to_pay"]))
+        case "progressive":
+            return ProgressiveDiscount(record["item"], int(record["threshold"]), int(record["percentage_off_next"]))
+        case "bulk":
+            return BulkDiscount(record["item"], int(record["threshold"]), int(record["new_price"]))
+
+
+def import_records(system: System, records: Iterable[dict[str, Any]]) -> ImportReport:
+    report = ImportReport()
+    items_names = set(system.catalog.get_items_names())
+    items = []
+    discount_records = []
+    for record_number, record in enumerate(records, start=1):
+        if isinstance(record, InvalidRecord):
+            report.add_error(record_number, record.message)
+            continue
+        if not isinstance(record, dict):
+            report.add_error(record_number, "record is not an object")
+            continue
+        if record.get("type", "item") == "item":
+            error = get_item_error(record, items_names)
+            if error is None:
+                items_names.add(record["name"])
+                items.append(Item(record["name"], record["category"], int(record["price"])))
+        else:
+            error = get_discount_error(record)
+            if error is None:
+                discount_records.append((record_number, record))
+        if error is not None:
+            report.add_error(record_number, error)
+
+    discounts = []
+    for record_number, record in discount_records:
+        referenced_names = [name for bundle in record["bundles"] for name in bundle] \
+            if record["type"] == "bundle" else [record["item"]]
+        nonexistent_items = [name for name in referenced_names if name not in items_names]
+        if nonexistent_items:
+            report.add_error(record_number, f"items {nonexistent_items} do not exist")
+            continue
+        discounts.append(create_discount_from_record(record))
+
+    report.errors.sort(key=lambda error: error["record"])
+    if report.is_ok():
+        system.import_data(items, discounts)
+        report.items_count = len(items)
+        report.discounts_count = len(discounts)
+    return report
+
+
+def import_file(system: System, path: str) -> ImportReport:
+    report = ImportReport()
+    try:
+        return import_records(system, read_records(path))
+    except (OSError, ValueError) as error:
+        report.add_error(0, str(error))
+        return report
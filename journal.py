@@ -0,0 +1,178 @@
+import json
+import os
+import struct
+import threading
+import time
+from argparse import ArgumentParser
+from typing import Any, Iterable, Iterator
+
+from receipt import ReceiptLine, get_line_prices
+
+RECORD_HEADER = struct.Struct("<I")
+INDEX_ENTRY = struct.Struct("<Q")
+
+
+class Journal:
+    """Append-only journal of finalized baskets.
+
+    Records are length-prefixed compact JSON arrays in the data file and the
+    index file holds the offset of every record, so record n is read with two
+    positioned reads. Appends only queue the record; a writer thread writes
+    queued records together and syncs them once per group, when
+    group_size records are queued or group_interval seconds have passed.
+    """
+
+    def __init__(self, path: str, group_size: int = 64, group_interval: float = 0.05,
+                 fsync: bool = True, read_only: bool = False) -> None:
+        self.path = path
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.fsync = fsync
+        self.pending = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.writer = None
+        if read_only:
+            self.data_file = open(path, "rb")
+            self.index_file = open(f"{path}.idx", "rb")
+            self.written_count = self.records_count = \
+                os.fstat(self.index_file.fileno()).st_size // INDEX_ENTRY.size
+            return
+        self.data_file = open(path, "a+b")
+        self.index_file = open(f"{path}.idx", "a+b")
+        self.recover()
+        self.writer = threading.Thread(target=self.write_groups, daemon=True)
+        self.writer.start()
+
+    def recover(self) -> None:
+        data_size = os.fstat(self.data_file.fileno()).st_size
+        index_size = os.fstat(self.index_file.fileno()).st_size
+        self.written_count = index_size // INDEX_ENTRY.size
+        offset = 0
+        while self.written_count:
+            last_offset = self.read_offset(self.written_count - 1)
+            if last_offset + RECORD_HEADER.size <= data_size:
+                end = last_offset + RECORD_HEADER.size + self.read_length(last_offset)
+                if end <= data_size:
+                    offset = end
+                    break
+            self.written_count -= 1
+        self.index_file.truncate(self.written_count * INDEX_ENTRY.size)
+        while offset + RECORD_HEADER.size <= data_size:
+            end = offset + RECORD_HEADER.size + self.read_length(offset)
+            if end > data_size:
+                break
+            self.index_file.write(INDEX_ENTRY.pack(offset))
+            self.written_count += 1
+            offset = end
+        self.data_file.truncate(offset)
+        self.index_file.flush()
+        self.data_size = offset
+        self.records_count = self.written_count
+
+    def read_offset(self, record_id: int) -> int:
+        return INDEX_ENTRY.unpack(os.pread(self.index_file.fileno(), INDEX_ENTRY.size,
+                                           record_id * INDEX_ENTRY.size))[0]
+
+    def read_length(self, offset: int) -> int:
+        return RECORD_HEADER.unpack(os.pread(self.data_file.fileno(), RECORD_HEADER.size, offset))[0]
+
+    def append(self, lines: Iterable[tuple[ReceiptLine, int]], version: int, basket_id: str | None = None) -> int:
+        runs = []
+        total = discounted_total = 0
+        for line, quantity in lines:
+            line_total, line_discounted_total = get_line_prices(line, quantity)
+            total += line_total
+            discounted_total += line_discounted_total
+            if runs and tuple(runs[-1][:5]) == line:
+                runs[-1][5] += quantity
+            else:
+                runs.append([*line, quantity])
+        with self.condition:
+            record_id = self.records_count
+            self.records_count += 1
+            self.pending.append(json.dumps([record_id, basket_id, time.time(), version, total,
+                                            discounted_total, runs], separators=(",", ":")).encode())
+            if len(self.pending) == 1 or len(self.pending) >= self.group_size:
+                self.condition.notify()
+        return record_id
+
+    def write_groups(self) -> None:
+        while True:
+            with self.condition:
+                if not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.closed and len(self.pending) < self.group_size:
+                    self.condition.wait(self.group_interval)
+                group, self.pending = self.pending, []
+                closed = self.closed
+            if group:
+                self.write_group(group)
+            if closed:
+                return
+
+    def write_group(self, group: list[bytes]) -> None:
+        data = bytearray()
+        index = bytearray()
+        for payload in group:
+            index += INDEX_ENTRY.pack(self.data_size + len(data))
+            data += RECORD_HEADER.pack(len(payload)) + payload
+        self.data_file.write(data)
+        self.data_file.flush()
+        if self.fsync:
+            os.fsync(self.data_file.fileno())
+        self.index_file.write(index)
+        self.index_file.flush()
+        self.data_size += len(data)
+        with self.condition:
+            self.written_count += len(group)
+            self.condition.notify_all()
+
+    def read(self, record_id: int) -> dict[str, Any] | None:
+        with self.condition:
+            if not 0 <= record_id < self.records_count:
+                return None
+            while record_id >= self.written_count:
+                self.condition.notify()
+                self.condition.wait()
+        offset = self.read_offset(record_id)
+        payload = os.pread(self.data_file.fileno(), self.read_length(offset), offset + RECORD_HEADER.size)
+        record_id, basket_id, timestamp, version, total, discounted_total, runs = json.loads(payload)
+        return {"id": record_id, "basket_id": basket_id, "time": timestamp, "version": version,
+                "total": total, "discounted_total": discounted_total,
+                "lines": [{"name": name, "category": category, "price": normal_price,
+                           "discounted_price": discounted_price,
+                           "discount": None if applied_discount_id is None else applied_discount_id + 1,
+                           "quantity": quantity}
+                          for name, category, normal_price, discounted_price, applied_discount_id, quantity in runs]}
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return (self.read(record_id) for record_id in range(self.records_count))
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.writer is not None:
+            self.writer.join()
+        self.data_file.close()
+        self.index_file.close()
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Print finalized baskets from a transaction journal")
+    parser.add_argument("path")
+    parser.add_argument("ids", type=int, nargs="*", help="record ids to print (default: the number of records)")
+    arguments = parser.parse_args()
+    journal = Journal(arguments.path, read_only=True)
+    try:
+        if not arguments.ids:
+            print(journal.records_count)
+        for record_id in arguments.ids:
+            print(json.dumps(journal.read(record_id)))
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from argparse import ArgumentParser
+
+
+async def connect(address: str) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[len("unix:"):], limit=2 ** 20)
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host or "127.0.0.1", int(port), limit=2 ** 20)
+
+
+async def send(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: dict) -> dict:
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def run_lane(address: str, seed: int, items_names: list[str], baskets: int, basket_size: int,
+                   latencies: dict[str, list[float]]) -> None:
+    generator = random.Random(seed)
+    reader, writer = await connect(address)
+    for _ in range(baskets):
+        for _ in range(basket_size):
+            start = time.perf_counter()
+            response = await send(reader, writer, {"command": "scan", "items": [generator.choice(items_names)]})
+            latencies["scan"].append(time.perf_counter() - start)
+            if not response["ok"]:
+                raise RuntimeError(response["error"])
+        start = time.perf_counter()
+        response = await send(reader, writer, {"command": "finalize", "format": "json"})
+        latencies["finalize"].append(time.perf_counter() - start)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+    await send(reader, writer, {"command": "quit"})
+    writer.close()
+
+
+async def run(address: str, lanes: int, baskets: int, basket_size: int, seed: int) -> None:
+    reader, writer = await connect(address)
+    items_names = [item["name"] for item in (await send(reader, writer, {"command": "catalog"}))["items"]]
+    await send(reader, writer, {"command": "quit"})
+    writer.close()
+
+    latencies = {"scan": [], "finalize": []}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_lane(address, seed + lane, items_names, baskets, basket_size, latencies)
+                           for lane in range(lanes)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{lanes} lanes, {lanes * baskets} baskets in {elapsed:.2f} s "
+          f"({lanes * baskets / elapsed:.1f} baskets/s)")
+    for request, values in latencies.items():
+        values.sort()
+        print(f"{request:<9} median {statistics.median(values) * 1000:8.2f} ms   "
+              f"p99 {values[int(len(values) * 0.99)] * 1000:8.2f} ms   max {values[-1] * 1000:8.2f} ms")
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Drive many simultaneous lanes against a till server")
+    parser.add_argument("address", help="host:port or unix:/path of the till server")
+    parser.add_argument("--lanes", type=int, default=200)
+    parser.add_argument("--baskets", type=int, default=5, help="baskets per lane")
+    parser.add_argument("--basket-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    asyncio.run(run(arguments.address, arguments.lanes, arguments.baskets,
+                    arguments.basket_size, arguments.seed))
+
+
+if __name__ == "__main__":
+    main()
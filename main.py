@@ -1,7 +1,124 @@
+import sys
+from argparse import ArgumentParser, Namespace
+
 from cli import CLI
+from config import load_configuration
+from importer import import_file
+from journal import Journal
+from store import Store
+from metrics import MetricsReporter, registry
+import batch
+import server
 
 def main() -> None:
-    cli = CLI()
+    parser = ArgumentParser(description="Grocery Store Till System")
+    parser.add_argument("--count-basket", action="store_true",
+                        help="store the basket as quantities per product")
+    parser.add_argument("--config",
+                        help="JSON file with the catalog and discounts to load on start")
+    parser.add_argument("--store",
+                        help="SQLite file that keeps the catalog and discounts between runs")
+    parser.add_argument("--import", dest="import_path", metavar="FILE",
+                        help="import products and discounts from a JSON, JSONL or CSV file, "
+                             "print the report and exit")
+    parser.add_argument("--snapshot", metavar="FILE",
+                        help="pricing snapshot exported with mapped.py for the batch workers to map")
+    parser.add_argument("--batch", metavar="BASKETS",
+                        help="price the baskets in a JSONL or CSV file without the interactive menu")
+    parser.add_argument("--output", help="file to write batch results to (default: standard output)")
+    parser.add_argument("--output-format", choices=["totals", "receipts", "aggregated", "json", "csv"],
+                        default="totals",
+                        help="write JSON totals, text receipts, aggregated text receipts, "
+                             "JSON receipts or CSV receipts in batch mode")
+    parser.add_argument("--workers", type=int,
+                        help="number of worker processes in batch and server mode (default: number of CPUs)")
+    parser.add_argument("--parallel-workers", type=int,
+                        help="search independent large groups of conflicting discounts at the same time "
+                             "in this many worker processes")
+    parser.add_argument("--budget", type=float, metavar="MS",
+                        help="search for the best discounts for at most this many milliseconds "
+                             "and use the best combination found")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="run a multi-lane till server on host:port or unix:/path")
+    parser.add_argument("--inline-group-size", type=int, default=4,
+                        help="conflict groups of at most this many discounts are priced on the server's "
+                             "event loop, larger ones in the worker pool")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="append every finalized basket to this transaction journal")
+    parser.add_argument("--journal-group-size", type=int, default=64,
+                        help="number of queued baskets that triggers a journal write")
+    parser.add_argument("--journal-interval", type=float, default=0.05,
+                        help="longest time in seconds a finalized basket waits before it is written")
+    parser.add_argument("--journal-no-fsync", action="store_true",
+                        help="write journal groups without waiting for them to reach the disk")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record checkout metrics and write them to this file periodically")
+    parser.add_argument("--metrics-format", choices=["text", "json"], default="text")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between metrics dumps")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record checkout spans and write them as a Chrome trace file on exit")
+    arguments = parser.parse_args()
+
+    reporter = None
+    if arguments.metrics is not None or arguments.trace is not None:
+        registry.enable(tracing=arguments.trace is not None)
+    if arguments.metrics is not None:
+        reporter = MetricsReporter(arguments.metrics, arguments.metrics_interval, arguments.metrics_format)
+        reporter.start()
+    try:
+        run(parser, arguments)
+    finally:
+        if reporter is not None:
+            reporter.stop()
+        if arguments.trace is not None:
+            registry.write_trace(arguments.trace)
+
+
+def run(parser: ArgumentParser, arguments: Namespace) -> None:
+    journal = None
+    if arguments.journal is not None:
+        journal = Journal(arguments.journal, arguments.journal_group_size,
+                          arguments.journal_interval, not arguments.journal_no_fsync)
+    try:
+        run_mode(parser, arguments, journal)
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def run_mode(parser: ArgumentParser, arguments: Namespace, journal: Journal | None) -> None:
+    if arguments.serve is not None:
+        if arguments.config is None and arguments.store is None:
+            parser.error("--serve requires --config or --store")
+        server.main(arguments.config, arguments.store, arguments.serve,
+                    arguments.workers, arguments.inline_group_size, journal)
+        return
+
+    if arguments.batch is not None:
+        if arguments.config is None and arguments.store is None and arguments.snapshot is None:
+            parser.error("--batch requires --config, --store or --snapshot")
+        batch.main(arguments.config, arguments.store, arguments.batch, arguments.output,
+                   arguments.output_format, arguments.workers, arguments.snapshot)
+        return
+
+    budget = arguments.budget / 1000 if arguments.budget is not None else None
+    cli = CLI(count_basket=arguments.count_basket, parallel_workers=arguments.parallel_workers, budget=budget)
+    cli.system.journal = journal
+    if arguments.store is not None:
+        store = Store(arguments.store)
+        load_config = store.is_empty()
+        cli.system.attach_store(store)
+    else:
+        load_config = True
+    if arguments.config is not None and load_config and not load_configuration(cli.system, arguments.config):
+        return
+    if arguments.import_path is not None:
+        report = import_file(cli.system, arguments.import_path)
+        print(report.get_text(), end="")
+        if not report.is_ok():
+            sys.exit(1)
+        return
     cli.main_menu()
 
 
@@ -0,0 +1,245 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from argparse import ArgumentParser
+from array import array
+from typing import Iterator
+
+from catalog import Catalog
+from config import load_system
+from discounts import create_discount
+from item import Item
+from snapshot import Snapshot
+from system import System
+
+MAGIC = b"TILLSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIQIIIIQQQQQQ")
+SLOT = struct.Struct("<I")
+ITEM = struct.Struct("<QIIqII")
+CATEGORY = struct.Struct("<QIII")
+DISCOUNT = struct.Struct("<QI")
+
+
+def get_slots_count(items_count: int) -> int:
+    slots_count = 1
+    while slots_count < items_count * 2:
+        slots_count *= 2
+    return slots_count
+
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_snapshot(snapshot: Snapshot, path: str) -> None:
+    """Writes the snapshot as a flat little-endian file.
+
+    After the header come an open addressing table from the CRC-32 of a
+    product name to its number, fixed size product, category and discount
+    records, the lists of discount ids per product and product numbers per
+    category, and the strings. The file is written next to path and renamed,
+    so processes that mapped an older file keep a consistent view.
+    """
+    items = list(snapshot.catalog)
+    strings = bytearray()
+    postings = array("I")
+
+    def add_string(text: str) -> tuple[int, int]:
+        encoded = text.encode()
+        strings.extend(encoded)
+        return len(strings) - len(encoded), len(encoded)
+
+    discount_ids_by_name = {}
+    for discount_id, discount in enumerate(snapshot.discounts):
+        for name in sorted(discount.get_items_names()):
+            discount_ids_by_name.setdefault(name, []).append(discount_id)
+
+    category_indices = {}
+    item_numbers_by_category = {}
+    item_records = bytearray()
+    slots = array("I", bytes(4 * get_slots_count(len(items))))
+    mask = len(slots) - 1
+    for number, item in enumerate(items):
+        category_index = category_indices.setdefault(item.category, len(category_indices))
+        item_numbers_by_category.setdefault(item.category, []).append(number)
+        discount_ids = discount_ids_by_name.get(item.name, [])
+        name_offset, name_length = add_string(item.name)
+        item_records += ITEM.pack(name_offset, name_length, category_index, item.normal_price,
+                                  len(postings), len(discount_ids))
+        postings.extend(discount_ids)
+        slot = zlib.crc32(item.name.encode()) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = number + 1
+
+    category_records = bytearray()
+    for category, numbers in item_numbers_by_category.items():
+        name_offset, name_length = add_string(category)
+        category_records += CATEGORY.pack(name_offset, name_length, len(postings), len(numbers))
+        postings.extend(numbers)
+
+    discount_records = bytearray()
+    for discount in snapshot.discounts:
+        data_offset, data_length = add_string(json.dumps(discount.get_data(), separators=(",", ":")))
+        discount_records += DISCOUNT.pack(data_offset, data_length)
+
+    sections = [to_little_endian(slots), bytes(item_records), bytes(category_records),
+                bytes(discount_records), to_little_endian(postings), bytes(strings)]
+    offsets = []
+    offset = HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, snapshot.version, len(items), len(slots),
+                                        len(category_indices), len(snapshot.discounts), *offsets))
+        for section in sections:
+            snapshot_file.write(section)
+    os.replace(temporary_path, path)
+
+
+class MappedCatalog:
+    """Read-only catalog over a mapped snapshot file.
+
+    Lookups read the records in place. Items returned by get are kept, so a
+    process only holds the products it has actually priced; iteration and
+    category lookups build items without keeping them.
+    """
+
+    def __init__(self, data: mmap.mmap) -> None:
+        self.data = data
+        (_, _, _, self.items_count, slots_count, categories_count, _, self.slots_offset,
+         self.items_offset, self.categories_offset, _, self.postings_offset,
+         self.strings_offset) = HEADER.unpack_from(data, 0)
+        self.mask = slots_count - 1
+        self.categories = [self.read_string(*CATEGORY.unpack_from(data, self.categories_offset
+                                                                   + index * CATEGORY.size)[:2])
+                           for index in range(categories_count)]
+        self.category_indices = {category: index for index, category in enumerate(self.categories)}
+        self.items = {}
+
+    def __contains__(self, item_name: str) -> bool:
+        return self.find(item_name) is not None
+
+    def __iter__(self) -> Iterator[Item]:
+        return (self.read_item(number) for number in range(self.items_count))
+
+    def __len__(self) -> int:
+        return self.items_count
+
+    def read_string(self, offset: int, length: int) -> str:
+        start = self.strings_offset + offset
+        return self.data[start:start + length].decode()
+
+    def read_postings(self, start: int, count: int) -> list[int]:
+        offset = self.postings_offset + start * SLOT.size
+        return [value for value, in SLOT.iter_unpack(self.data[offset:offset + count * SLOT.size])]
+
+    def read_record(self, number: int) -> tuple[int, int, int, int, int, int]:
+        return ITEM.unpack_from(self.data, self.items_offset + number * ITEM.size)
+
+    def read_item(self, number: int) -> Item:
+        name_offset, name_length, category_index, price, _, _ = self.read_record(number)
+        return Item(self.read_string(name_offset, name_length), self.categories[category_index], price)
+
+    def find(self, item_name: str) -> int | None:
+        encoded = item_name.encode()
+        slot = zlib.crc32(encoded) & self.mask
+        while True:
+            entry, = SLOT.unpack_from(self.data, self.slots_offset + slot * SLOT.size)
+            if not entry:
+                return None
+            name_offset, name_length = ITEM.unpack_from(self.data, self.items_offset + (entry - 1) * ITEM.size)[:2]
+            start = self.strings_offset + name_offset
+            if name_length == len(encoded) and self.data[start:start + name_length] == encoded:
+                return entry - 1
+            slot = (slot + 1) & self.mask
+
+    def get(self, item_name: str) -> Item | None:
+        item = self.items.get(item_name)
+        if item is None:
+            number = self.find(item_name)
+            if number is None:
+                return None
+            item = self.items[item_name] = self.read_item(number)
+        return item
+
+    def get_price(self, item_name: str) -> int | None:
+        number = self.find(item_name)
+        return None if number is None else self.read_record(number)[3]
+
+    def get_category(self, item_name: str) -> str | None:
+        number = self.find(item_name)
+        return None if number is None else self.categories[self.read_record(number)[2]]
+
+    def get_discount_ids(self, item_name: str) -> list[int]:
+        number = self.find(item_name)
+        if number is None:
+            return []
+        _, _, _, _, postings_start, postings_count = self.read_record(number)
+        return self.read_postings(postings_start, postings_count)
+
+    def get_items_names(self) -> list[str]:
+        return [self.read_string(*self.read_record(number)[:2]) for number in range(self.items_count)]
+
+    def get_items_by_category(self, category: str) -> list[Item]:
+        index = self.category_indices.get(category)
+        if index is None:
+            return []
+        _, _, items_start, items_count = CATEGORY.unpack_from(self.data, self.categories_offset + index * CATEGORY.size)
+        return [self.read_item(number) for number in self.read_postings(items_start, items_count)]
+
+    def copy(self) -> Catalog:
+        catalog = Catalog()
+        catalog.load(self)
+        return catalog
+
+
+def load_snapshot(path: str) -> Snapshot:
+    with open(path, "rb") as snapshot_file:
+        data = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < HEADER.size:
+        raise ValueError(f"\"{path}\" is not a pricing snapshot")
+    magic, format_version, version, _, _, _, discounts_count, _, _, _, discounts_offset, _, strings_offset = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError(f"\"{path}\" is not a version {FORMAT_VERSION} pricing snapshot")
+    discounts = []
+    for index in range(discounts_count):
+        data_offset, data_length = DISCOUNT.unpack_from(data, discounts_offset + index * DISCOUNT.size)
+        start = strings_offset + data_offset
+        discounts.append(create_discount(json.loads(data[start:start + data_length])))
+    return Snapshot(version, MappedCatalog(data), tuple(discounts))
+
+
+def load_mapped_system(path: str) -> System:
+    system = System(count_basket=True)
+    system.load_snapshot(load_snapshot(path))
+    return system
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Export the catalog and discounts as a memory-mapped pricing snapshot")
+    parser.add_argument("path", help="snapshot file to write")
+    parser.add_argument("--config", help="JSON file with the catalog and discounts")
+    parser.add_argument("--store", help="SQLite store with the catalog and discounts")
+    arguments = parser.parse_args()
+    if arguments.config is None and arguments.store is None:
+        parser.error("--config or --store is required")
+    system = load_system(arguments.config, arguments.store)
+    if system is None:
+        raise SystemExit(1)
+    write_snapshot(system.snapshot, arguments.path)
+    print(f"Wrote {len(system.catalog)} items and {len(system.discounts)} discounts to {arguments.path}")
+
+
+if __name__ == "__main__":
+    main()
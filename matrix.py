@@ -0,0 +1,137 @@
+from itertools import permutations
+from typing import Iterable
+
+from catalog import Catalog
+from discounts import Discount, BundleDiscount, ProgressiveDiscount, BulkDiscount
+from planner import get_conflict_groups
+from solver import DiscountSolver
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class MatrixPricer:
+    """Prices many baskets at once from a baskets x products count matrix.
+
+    The units of a basket are taken in catalog order, so every row is priced
+    like a count basket scanned product by product in that order. Conflict
+    groups of up to max_group_size discounts are solved by trying every order
+    of the group with array operations over all rows; larger groups fall back
+    to the scalar solver row by row.
+    """
+
+    def __init__(self, catalog: Catalog, discounts: list[Discount], max_group_size: int = 6) -> None:
+        if np is None:
+            raise ImportError("the matrix pricing engine requires numpy")
+        self.names = catalog.get_items_names()
+        self.columns = {name: column for column, name in enumerate(self.names)}
+        self.prices = np.array([item.normal_price for item in catalog], dtype=np.int64)
+        self.groups = get_conflict_groups(list(enumerate(discounts)), set(self.names))
+        self.max_group_size = max_group_size
+        self.solver = DiscountSolver()
+
+    def get_count_matrix(self, baskets: Iterable[list[tuple[str, int]]]) -> "np.ndarray":
+        baskets = list(baskets)
+        counts = np.zeros((len(baskets), len(self.names)), dtype=np.int64)
+        for row, counted_items in enumerate(baskets):
+            for item_name, quantity in counted_items:
+                counts[row, self.columns[item_name]] += quantity
+        return counts
+
+    def price(self, counts: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+        totals = counts @ self.prices
+        price_changes = np.zeros(len(counts), dtype=np.int64)
+        for group in self.groups:
+            if len(group) > self.max_group_size:
+                price_changes += self.solve_group_by_rows(counts, group)
+            else:
+                price_changes += self.solve_group(counts, group)
+        return totals, totals + price_changes
+
+    def solve_group(self, counts: "np.ndarray", group: list[tuple[int, Discount]]) -> "np.ndarray":
+        best = None
+        for sequence in permutations(discount for _, discount in group):
+            consumed = {}
+            price_change = np.zeros(len(counts), dtype=np.int64)
+            for discount in sequence:
+                price_change += self.apply(discount, counts, consumed)
+            best = price_change if best is None else np.minimum(best, price_change)
+        return best
+
+    def solve_group_by_rows(self, counts: "np.ndarray", group: list[tuple[int, Discount]]) -> "np.ndarray":
+        columns = sorted({self.columns[name] for _, discount in group
+                          for name in discount.get_items_names() if name in self.columns})
+        price_changes = np.zeros(len(counts), dtype=np.int64)
+        for row in range(len(counts)):
+            lines = {}
+            position = 0
+            for column in columns:
+                quantity = int(counts[row, column])
+                price = int(self.prices[column])
+                lines[self.names[column]] = [(position, quantity, price)] if quantity else []
+                position += quantity
+            consumed = self.solver.prepare(group, lines)
+            live = self.solver.get_live_discounts(range(len(group)), consumed)
+            price_changes[row] = self.solver.get_best_price_change(live, consumed)
+        return price_changes
+
+    def apply(self, discount: Discount, counts: "np.ndarray", consumed: dict[int, "np.ndarray"]) -> "np.ndarray":
+        match discount:
+            case BundleDiscount():
+                return self.apply_bundle(discount, counts, consumed)
+            case ProgressiveDiscount():
+                return self.apply_progressive(discount, counts, consumed)
+            case BulkDiscount():
+                return self.apply_bulk(discount, counts, consumed)
+        raise TypeError(f"unsupported discount type \"{discount.get_type()}\"")
+
+    def get_remaining(self, column: int, counts: "np.ndarray", consumed: dict[int, "np.ndarray"]) -> "np.ndarray":
+        return counts[:, column] - consumed.get(column, 0)
+
+    def apply_bundle(self, discount: BundleDiscount, counts: "np.ndarray",
+                     consumed: dict[int, "np.ndarray"]) -> "np.ndarray":
+        price_change = np.zeros(len(counts), dtype=np.int64)
+        quantity_to_discount = len(range(discount.threshold)[:discount.threshold - discount.quantity_to_pay])
+        for bundle in discount.bundle_sets:
+            columns = sorted(self.columns[name] for name in bundle if name in self.columns)
+            if not columns or discount.threshold == 0:
+                continue
+            remaining = [self.get_remaining(column, counts, consumed) for column in columns]
+            applies = sum(remaining) >= discount.threshold
+            left = np.full(len(counts), discount.threshold, dtype=np.int64)
+            taken = []
+            for column_remaining in remaining:
+                column_taken = np.minimum(column_remaining, left)
+                taken.append(np.where(applies, column_taken, 0))
+                left -= column_taken
+            left = np.full(len(counts), quantity_to_discount, dtype=np.int64)
+            for position in sorted(range(len(columns)), key=lambda position: self.prices[columns[position]]):
+                discounted = np.minimum(taken[position], left)
+                left -= discounted
+                price_change -= discounted * self.prices[columns[position]]
+            for column, column_taken in zip(columns, taken):
+                consumed[column] = consumed.get(column, 0) + column_taken
+        return price_change
+
+    def apply_progressive(self, discount: ProgressiveDiscount, counts: "np.ndarray",
+                          consumed: dict[int, "np.ndarray"]) -> "np.ndarray":
+        column = self.columns.get(discount.item)
+        if column is None:
+            return 0
+        candidate_group_size = discount.threshold + 1
+        candidate_groups_count = self.get_remaining(column, counts, consumed) // candidate_group_size
+        consumed[column] = consumed.get(column, 0) + candidate_groups_count * candidate_group_size
+        price = int(self.prices[column])
+        return -candidate_groups_count * round((discount.percentage_off_next/100)*price)
+
+    def apply_bulk(self, discount: BulkDiscount, counts: "np.ndarray",
+                   consumed: dict[int, "np.ndarray"]) -> "np.ndarray":
+        column = self.columns.get(discount.item)
+        if column is None:
+            return 0
+        remaining = self.get_remaining(column, counts, consumed)
+        discounted = np.where((remaining > 0) & (remaining >= discount.threshold), remaining, 0)
+        consumed[column] = consumed.get(column, 0) + discounted
+        return discounted * (discount.new_price - int(self.prices[column]))
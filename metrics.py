@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+        self.trace_events = None
+
+    def enable(self, tracing: bool = False) -> None:
+        if tracing and self.trace_events is None:
+            self.trace_events = []
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters = {}
+            self.statistics = {}
+
+    def init_worker(self, enabled: bool, tracing: bool) -> None:
+        self.reset()
+        self.trace_events = [] if tracing else None
+        self.enabled = enabled
+
+    def take_snapshot(self) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        with self.lock:
+            snapshot = {"counters": self.counters, "statistics": self.statistics,
+                        "trace_events": self.trace_events}
+            self.counters = {}
+            self.statistics = {}
+            if self.trace_events is not None:
+                self.trace_events = []
+        return snapshot
+
+    def merge(self, snapshot: dict[str, Any] | None) -> None:
+        """Adds a snapshot taken in a worker process with take_snapshot."""
+        if snapshot is None:
+            return
+        with self.lock:
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot["statistics"].items():
+                statistic = self.statistics.get(name)
+                if statistic is None:
+                    self.statistics[name] = dict(other)
+                    continue
+                statistic["count"] += other["count"]
+                statistic["total"] += other["total"]
+                statistic["min"] = min(statistic["min"], other["min"])
+                statistic["max"] = max(statistic["max"], other["max"])
+            if self.trace_events is not None and snapshot["trace_events"]:
+                self.trace_events.extend(snapshot["trace_events"])
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self.lock:
+            statistic = self.statistics.get(name)
+            if statistic is None:
+                self.statistics[name] = {"count": 1, "total": value, "min": value, "max": value}
+                return
+            statistic["count"] += 1
+            statistic["total"] += value
+            statistic["min"] = min(statistic["min"], value)
+            statistic["max"] = max(statistic["max"], value)
+
+    def add_trace_event(self, name: str, start: float, duration: float, arguments: dict[str, Any]) -> None:
+        if self.trace_events is None:
+            return
+        event = {"name": name, "ph": "X", "ts": start * 1_000_000, "dur": duration * 1_000_000,
+                 "pid": os.getpid(), "tid": threading.get_ident(), "args": arguments}
+        with self.lock:
+            self.trace_events.append(event)
+
+    def get_snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            statistics = {name: {**statistic, "mean": statistic["total"] / statistic["count"]}
+                          for name, statistic in self.statistics.items()}
+            return {"time": time.time(), "counters": dict(self.counters), "statistics": statistics}
+
+    def get_text(self) -> str:
+        snapshot = self.get_snapshot()
+        lines = [f"{name} {value}" for name, value in sorted(snapshot["counters"].items())]
+        for name, statistic in sorted(snapshot["statistics"].items()):
+            lines.append(f"{name} count={statistic['count']} mean={statistic['mean']:.6g} "
+                         f"min={statistic['min']:.6g} max={statistic['max']:.6g} total={statistic['total']:.6g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, metrics_format: str = "text") -> None:
+        content = json.dumps(self.get_snapshot()) if metrics_format == "json" else self.get_text()
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(content)
+        os.replace(temporary_path, path)
+
+    def write_trace(self, path: str) -> None:
+        with self.lock:
+            events = list(self.trace_events or [])
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+registry = MetricsRegistry()
+
+
+def instrumented(name: str, get_attributes: Callable[..., dict[str, float]] | None = None):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            attributes = get_attributes(*args, **kwargs) if get_attributes is not None else {}
+            allocated_blocks = sys.getallocatedblocks()
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                attributes["allocated_blocks"] = sys.getallocatedblocks() - allocated_blocks
+                registry.increment(f"{name}.calls")
+                registry.observe(f"{name}.seconds", duration)
+                for attribute, value in attributes.items():
+                    registry.observe(f"{name}.{attribute}", value)
+                registry.add_trace_event(name, start, duration, attributes)
+        return wrapper
+    return decorator
+
+
+class MetricsReporter(threading.Thread):
+    def __init__(self, path: str, interval: float = 10.0, metrics_format: str = "text") -> None:
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.metrics_format = metrics_format
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            registry.write(self.path, self.metrics_format)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        registry.write(self.path, self.metrics_format)
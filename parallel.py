@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from basket import Basket
+from discounts import Discount
+from solver import DiscountSolver, GroupResult
+from metrics import instrumented, registry
+
+
+def solve_live_group(discounts: list[tuple[int, Discount]], lines: dict[str, list[tuple[int, int, int]]],
+                     group: tuple[int, ...]) -> tuple[int, list[int], int]:
+    solver = DiscountSolver()
+    consumed = solver.prepare(discounts, lines)
+    return (solver.get_best_price_change(group, consumed), solver.get_sequence(group, consumed),
+            len(solver.best_prices))
+
+
+class ParallelSolver(DiscountSolver):
+    """Searches independent conflict groups in worker processes.
+
+    Groups that share no products reach no common states, so each large one
+    is searched whole by one worker with its own memo and the results are
+    combined in group order, exactly as DiscountSolver combines them. The
+    largest group is searched in this process while the workers run. A single
+    group is never split between workers, because orders with different first
+    discounts soon reach the same states and the workers would repeat each
+    other's search. Checkout time therefore drops with the number of large
+    independent groups, up to workers + 1, and one large group costs the same
+    as the serial search.
+    """
+
+    def __init__(self, workers: int | None = None, min_group_size: int = 6) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.min_group_size = min_group_size
+        self.executor = None
+
+    @instrumented("solver.solve", lambda solver, basket, discounts: {"basket_size": basket.get_size(),
+                                                                     "active_discounts": len(discounts)})
+    def solve(self, basket: Basket, discounts: list[tuple[int, Discount]]) -> tuple[int, list[tuple[int, Discount]]]:
+        return self.solve_groups(basket, [discounts])[0][:2]
+
+    def solve_groups(self, basket: Basket, groups: list[list[tuple[int, Discount]]]) -> list[GroupResult]:
+        searches = []
+        for discounts in groups:
+            solver = DiscountSolver()
+            lines = basket.get_unassigned_lines(
+                {name for _, discount in discounts for name in discount.get_items_names()})
+            consumed = solver.prepare(discounts, lines)
+            searches.append((solver, consumed, solver.split_into_groups(
+                solver.get_live_discounts(range(len(discounts)), consumed))))
+
+        large_groups = sorted(((len(live_group), search_index, group_index)
+                               for search_index, (_, _, live_groups) in enumerate(searches)
+                               for group_index, live_group in enumerate(live_groups)
+                               if len(live_group) >= self.min_group_size), reverse=True)
+        futures = {}
+        if self.workers > 1 and len(large_groups) > 1:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            for _, search_index, group_index in large_groups[1:]:
+                solver, _, live_groups = searches[search_index]
+                futures[search_index, group_index] = self.executor.submit(
+                    solve_live_group, solver.discounts, solver.lines, live_groups[group_index])
+
+        group_results = {}
+        evaluated = 0
+        for search_index, (solver, consumed, live_groups) in enumerate(searches):
+            for group_index, live_group in enumerate(live_groups):
+                if (search_index, group_index) not in futures:
+                    group_results[search_index, group_index] = (solver.get_best_price_change(live_group, consumed),
+                                                                solver.get_sequence(live_group, consumed))
+            evaluated += len(solver.best_prices)
+        for key, future in futures.items():
+            price_change, sequence, group_evaluated = future.result()
+            group_results[key] = price_change, sequence
+            evaluated += group_evaluated
+
+        results = []
+        for search_index, (solver, _, live_groups) in enumerate(searches):
+            price_change = 0
+            sequence = []
+            for group_index in range(len(live_groups)):
+                group_price_change, group_sequence = group_results[search_index, group_index]
+                price_change += group_price_change
+                sequence.extend(group_sequence)
+            results.append((price_change, [solver.discounts[index] for index in sequence], True, 0))
+        if registry.enabled:
+            registry.increment("solver.candidates_evaluated", evaluated)
+        return results
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
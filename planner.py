@@ -0,0 +1,35 @@
+from discounts import Discount
+
+
+def group_by_conflicts(items_names: list[set[str]]) -> list[list[int]]:
+    parents = list(range(len(items_names)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    owners = {}
+    for index, names in enumerate(items_names):
+        for name in names:
+            if name in owners:
+                parents[find(index)] = find(owners[name])
+            else:
+                owners[name] = index
+
+    groups = {}
+    for index in range(len(items_names)):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
+
+
+def get_conflict_groups(discounts: list[tuple[int, Discount]],
+                        basket_items_names: set[str] | None = None) -> list[list[tuple[int, Discount]]]:
+    items_names = [discount.get_items_names() for _, discount in discounts]
+    if basket_items_names is not None:
+        items_names = [names & basket_items_names for names in items_names]
+    groups = group_by_conflicts(items_names)
+    return [[discounts[index] for index in group] for group in groups
+            if any(items_names[index] for index in group)]
+
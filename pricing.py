@@ -0,0 +1,88 @@
+from basket import Basket
+from cache import ResultCache, Signature, get_signature
+from discounts import Discount
+from planner import get_conflict_groups
+
+
+class IncrementalPricer:
+    def __init__(self, solver, cache: ResultCache | None = None) -> None:
+        self.solver = solver
+        self.cache = cache
+        self.basket = None
+        self.reset([])
+
+    def reset(self, discounts: list[tuple[int, Discount]]) -> None:
+        self.groups = get_conflict_groups(discounts)
+        self.groups_by_name = {}
+        self.groups_names = []
+        for group_index, group in enumerate(self.groups):
+            self.groups_names.append(set())
+            for _, discount in group:
+                for name in discount.get_items_names():
+                    self.groups_by_name[name] = group_index
+                    self.groups_names[group_index].add(name)
+        self.basket = None
+        self.results = {}
+        self.gaps = {}
+        self.proven = {}
+
+    def update(self, basket: Basket, items_names: set[str]) -> None:
+        self.solve_groups(basket, self.get_unsolved_groups(basket, items_names))
+
+    def get_unsolved_groups(self, basket: Basket, items_names: set[str]) -> list[int]:
+        if basket is not self.basket:
+            self.basket = basket
+            self.results = {}
+            self.gaps = {}
+            self.proven = {}
+            items_names = basket.get_items_names()
+        affected_groups = {self.groups_by_name[name]
+                           for name in items_names if name in self.groups_by_name}
+        return [group_index for group_index in affected_groups
+                if not self.use_cached_result(basket, group_index)]
+
+    def solve_groups(self, basket: Basket, group_indices: list[int]) -> None:
+        results = self.solver.solve_groups(basket, [self.groups[group_index] for group_index in group_indices])
+        for group_index, (price_change, sequence, proven, gap) in zip(group_indices, results):
+            self.set_result(basket, group_index, price_change, sequence, proven, gap)
+
+    def get_cache_key(self, basket: Basket, group_index: int) -> tuple[tuple[Discount, ...], Signature]:
+        return (tuple(discount for _, discount in self.groups[group_index]),
+                get_signature(basket.get_unassigned_lines(self.groups_names[group_index])))
+
+    def use_cached_result(self, basket: Basket, group_index: int) -> bool:
+        if self.cache is None:
+            return False
+        result = self.cache.get(*self.get_cache_key(basket, group_index))
+        if result is None:
+            return False
+        group = self.groups[group_index]
+        self.results[group_index] = result[0], [group[position] for position in result[1]]
+        self.gaps[group_index] = 0
+        self.proven[group_index] = True
+        return True
+
+    def set_result(self, basket: Basket, group_index: int, price_change: int,
+                   sequence: list[tuple[int, Discount]], proven: bool = True, gap: int = 0) -> None:
+        self.results[group_index] = price_change, sequence
+        self.gaps[group_index] = gap
+        self.proven[group_index] = proven
+        if self.cache is not None and proven:
+            positions = {discount_id: position for position, (discount_id, _) in enumerate(self.groups[group_index])}
+            self.cache.put(*self.get_cache_key(basket, group_index),
+                           (price_change, tuple(positions[discount_id] for discount_id, _ in sequence)))
+
+    def get_discounted_price(self, basket: Basket) -> int:
+        self.update(basket, set())
+        price_change = sum(change for change, _ in self.results.values())
+        return basket.get_total_price() + price_change
+
+    def get_best_sequence(self, basket: Basket) -> list[tuple[int, Discount]]:
+        self.update(basket, set())
+        return [discount for _, sequence in self.results.values() for discount in sequence]
+
+    def get_gap(self) -> int:
+        return sum(self.gaps.values())
+
+    def is_proven(self) -> bool:
+        return all(self.proven.values())
@@ -0,0 +1,91 @@
+from typing import Iterable
+
+from discounts import Discount, BundleDiscount, ProgressiveDiscount, BulkDiscount
+
+MAX_STATES = 100000
+
+Step = tuple
+
+
+def get_steps(item_name: str, discounts: Iterable[Discount]) -> list[Step]:
+    steps = []
+    for discount in discounts:
+        if item_name not in discount.get_items_names():
+            continue
+        match discount:
+            case BundleDiscount():
+                applications = sum(item_name in bundle for bundle in discount.bundle_sets)
+                free_count = len(range(discount.threshold)[:discount.threshold - discount.quantity_to_pay])
+                steps.append(("bundle", discount.threshold, free_count, applications))
+            case ProgressiveDiscount():
+                steps.append(("progressive", discount.threshold + 1, discount.percentage_off_next))
+            case BulkDiscount():
+                steps.append(("bulk", discount.threshold, discount.new_price))
+    return steps
+
+
+class PriceFunction:
+    """Best price of any quantity of one product.
+
+    A step that cannot apply to the remaining quantity never applies later,
+    so the price only depends on the remaining quantity and the steps that
+    can still apply. Best prices of those states are kept between quotes,
+    and the number of states does not grow with the quoted quantity.
+    """
+
+    def __init__(self, price: int, steps: list[Step]) -> None:
+        self.price = price
+        self.steps = tuple(sorted(steps))
+        self.best_prices = {}
+
+    def can_apply(self, step: Step, remaining: int) -> bool:
+        match step:
+            case ("bundle", threshold, _, applications):
+                return applications > 0 and 0 < threshold <= remaining
+            case ("progressive", group_size, _):
+                return remaining >= group_size
+            case ("bulk", threshold, _):
+                return remaining > 0 and remaining >= threshold
+        return False
+
+    def apply_step(self, step: Step, remaining: int) -> tuple[int, int]:
+        price = self.price
+        total = 0
+        match step:
+            case ("bundle", threshold, free_count, applications):
+                for _ in range(applications):
+                    if remaining < threshold:
+                        break
+                    total += (threshold - free_count) * price
+                    remaining -= threshold
+            case ("progressive", group_size, percentage_off_next):
+                groups_count = remaining // group_size
+                discounted_price = price - round((percentage_off_next/100)*price)
+                total += groups_count * ((group_size - 1) * price + discounted_price)
+                remaining -= groups_count * group_size
+            case ("bulk", _, new_price):
+                total += remaining * new_price
+                remaining = 0
+        return total, remaining
+
+    def get_best_price(self, remaining: int, steps: tuple[Step, ...]) -> int:
+        steps = tuple(step for step in steps if self.can_apply(step, remaining))
+        if not steps:
+            return remaining * self.price
+        key = (remaining, steps)
+        best = self.best_prices.get(key)
+        if best is None:
+            for position, step in enumerate(steps):
+                if position and step == steps[position - 1]:
+                    continue
+                total, new_remaining = self.apply_step(step, remaining)
+                price = total + self.get_best_price(new_remaining, steps[:position] + steps[position + 1:])
+                if best is None or price < best:
+                    best = price
+            self.best_prices[key] = best
+        return best
+
+    def get_price(self, quantity: int) -> int:
+        if len(self.best_prices) > MAX_STATES:
+            self.best_prices = {}
+        return self.get_best_price(quantity, self.steps)
@@ -0,0 +1,128 @@
+import csv
+import json
+from textwrap import dedent
+from typing import TYPE_CHECKING, Iterable, TextIO
+
+if TYPE_CHECKING:
+    from basket import Basket
+
+ReceiptLine = tuple[str, str, int, int | None, int | None]
+
+RECEIPT_FORMATS = ("text", "aggregated", "json", "csv")
+
+
+def calculate_aws(clouds: int) -> tuple[int, int]:
+    return clouds//100, clouds % 100
+
+
+def get_line_prices(line: ReceiptLine, quantity: int) -> tuple[int, int]:
+    _, _, normal_price, discounted_price, _ = line
+    if discounted_price is None:
+        discounted_price = normal_price
+    return normal_price * quantity, discounted_price * quantity
+
+
+def get_line_str(line: ReceiptLine, quantity: int | None = None) -> str:
+    name, category, normal_price, discounted_price, applied_discount_id = line
+    if discounted_price is None:
+        discounted_price = '-'
+    if applied_discount_id is not None:
+        discount_id = applied_discount_id + 1
+    else:
+        discount_id = 'no discount'
+    if quantity is not None:
+        name = f"{name} x{quantity}"
+    return f"{name}, {category}, {normal_price}c, {discounted_price}, {discount_id}\n"
+
+
+def aggregate_lines(lines: Iterable[tuple[ReceiptLine, int]]) -> dict[ReceiptLine, int]:
+    quantities = {}
+    for line, quantity in lines:
+        quantities[line] = quantities.get(line, 0) + quantity
+    return quantities
+
+
+def write_totals(output: TextIO, total: int, discounted_total: int) -> None:
+    aws_normal, clouds_normal = calculate_aws(total)
+    aws_discounted, clouds_discounted = calculate_aws(discounted_total)
+    prices = f"""\
+    Total price:          {total}c = {aws_normal} aws {clouds_normal} clouds
+    Price with discounts: {discounted_total}c = {aws_discounted} aws {clouds_discounted} clouds
+    Saved:                {total - discounted_total}c\
+        """
+    output.write(dedent(prices))
+
+
+def write_text_receipt(lines: Iterable[tuple[ReceiptLine, int]], output: TextIO, aggregated: bool = False) -> None:
+    output.write("Item, Category, Normal Price, Discounted Price, Applied Discount No.\n")
+    if aggregated:
+        lines = aggregate_lines(lines).items()
+    total = discounted_total = 0
+    for line, quantity in lines:
+        if aggregated:
+            output.write(get_line_str(line, quantity))
+        else:
+            output.write(get_line_str(line) * quantity)
+        line_total, line_discounted_total = get_line_prices(line, quantity)
+        total += line_total
+        discounted_total += line_discounted_total
+    output.write("----------------------------------\n")
+    write_totals(output, total, discounted_total)
+
+
+def get_line_data(line: ReceiptLine, quantity: int) -> dict:
+    name, category, normal_price, discounted_price, applied_discount_id = line
+    return {"name": name, "category": category, "quantity": quantity,
+            "normal_price": normal_price, "discounted_price": discounted_price,
+            "applied_discount": applied_discount_id + 1 if applied_discount_id is not None else None}
+
+
+def write_json_receipt(lines: Iterable[tuple[ReceiptLine, int]], output: TextIO, basket_id: str | None = None) -> None:
+    output.write("{")
+    if basket_id is not None:
+        output.write(f"\"id\": {json.dumps(basket_id)}, ")
+    output.write("\"lines\": [")
+    total = discounted_total = 0
+    for index, (line, quantity) in enumerate(aggregate_lines(lines).items()):
+        if index:
+            output.write(", ")
+        output.write(json.dumps(get_line_data(line, quantity)))
+        line_total, line_discounted_total = get_line_prices(line, quantity)
+        total += line_total
+        discounted_total += line_discounted_total
+    output.write(f"], \"total\": {total}, \"discounted_total\": {discounted_total}, "
+                 f"\"saved\": {total - discounted_total}}}")
+
+
+CSV_HEADER = ["name", "category", "quantity", "normal_price",
+              "discounted_price", "applied_discount"]
+
+
+def write_csv_receipt(lines: Iterable[tuple[ReceiptLine, int]], output: TextIO,
+                      basket_id: str | None = None, header: bool = True) -> None:
+    writer = csv.writer(output, lineterminator="\n")
+    prefix = [] if basket_id is None else [basket_id]
+    if header:
+        writer.writerow(([] if basket_id is None else ["basket"]) + CSV_HEADER)
+    total = discounted_total = 0
+    for line, quantity in aggregate_lines(lines).items():
+        writer.writerow(prefix + list(get_line_data(line, quantity).values()))
+        line_total, line_discounted_total = get_line_prices(line, quantity)
+        total += line_total
+        discounted_total += line_discounted_total
+    writer.writerow(prefix + ["TOTAL", "", "", total, discounted_total, ""])
+
+
+def write_receipt(basket: "Basket", output: TextIO, receipt_format: str = "text", basket_id: str | None = None) -> None:
+    lines = basket.get_receipt_lines()
+    match receipt_format:
+        case "text":
+            write_text_receipt(lines, output)
+        case "aggregated":
+            write_text_receipt(lines, output, aggregated=True)
+        case "json":
+            write_json_receipt(lines, output, basket_id)
+        case "csv":
+            write_csv_receipt(lines, output, basket_id, header=basket_id is None)
+        case _:
+            raise ValueError(f"Unknown receipt format \"{receipt_format}\"")
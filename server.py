@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from basket import CountBasket
+from batch import parse_counted_items
+from cache import ResultCache
+from config import load_system
+from discounts import Discount
+from item import Item
+from journal import Journal
+from mapped import load_mapped_system, write_snapshot
+from metrics import registry
+from pricing import IncrementalPricer
+from receipt import RECEIPT_FORMATS, write_receipt
+from solver import DiscountSolver
+from system import System
+
+worker_system = None
+worker_solver = None
+
+
+def init_worker(snapshot_path: str, metrics_enabled: bool = False, tracing: bool = False) -> None:
+    global worker_system, worker_solver
+    registry.init_worker(metrics_enabled, tracing)
+    worker_system = load_mapped_system(snapshot_path)
+    worker_solver = DiscountSolver()
+
+
+def get_checkout_result(basket: CountBasket, receipt_format: str) -> dict:
+    receipt = StringIO()
+    write_receipt(basket, receipt, receipt_format)
+    total = basket.get_total_price()
+    discounted_total = basket.get_discounted_price()
+    return {"total": total, "discounted_total": discounted_total,
+            "saved": total - discounted_total, "receipt": receipt.getvalue(),
+            "lines": list(basket.get_receipt_lines())}
+
+
+def solve_groups(counted_items: list[tuple[str, int]],
+                 groups: list[list[int]]) -> tuple[list[tuple[int, list[int]]], dict | None]:
+    discounts = worker_system.discounts
+    catalog = worker_system.catalog
+    return solve_discount_groups([(catalog.get(item_name), quantity) for item_name, quantity in counted_items],
+                                 [[(discount_id, discounts[discount_id]) for discount_id in discount_ids]
+                                  for discount_ids in groups])
+
+
+def solve_discount_groups(counted_items: list[tuple[Item, int]],
+                          groups: list[list[tuple[int, Discount]]]) -> tuple[list[tuple[int, list[int]]], dict | None]:
+    basket = CountBasket()
+    for item, quantity in counted_items:
+        basket.add_item(item, quantity)
+    results = []
+    for group in groups:
+        price_change, sequence = worker_solver.solve(basket, group)
+        results.append((price_change, [discount_id for discount_id, _ in sequence]))
+    return results, registry.take_snapshot()
+
+
+class Lane:
+    def __init__(self, system: System, cache: ResultCache | None = None) -> None:
+        self.system = system
+        self.pricer = IncrementalPricer(DiscountSolver(), cache)
+        self.snapshot = None
+        self.empty()
+
+    def add_items(self, counted_items: list[tuple[str, int]]) -> list[int]:
+        for item_name, quantity in counted_items:
+            self.basket.add_item(self.snapshot.catalog.get(item_name), quantity)
+        return self.pricer.get_unsolved_groups(self.basket, {item_name for item_name, _ in counted_items})
+
+    def get_groups_discount_ids(self, group_indices: list[int]) -> list[list[int]]:
+        return [[discount_id for discount_id, _ in self.pricer.groups[group_index]] for group_index in group_indices]
+
+    def get_groups(self, group_indices: list[int]) -> list[list[tuple[int, Discount]]]:
+        return [self.pricer.groups[group_index] for group_index in group_indices]
+
+    def set_results(self, group_indices: list[int], results: list[tuple[int, list[int]]]) -> None:
+        for group_index, (price_change, discount_ids) in zip(group_indices, results):
+            self.pricer.set_result(self.basket, group_index, price_change,
+                                   [(discount_id, self.snapshot.discounts[discount_id]) for discount_id in discount_ids])
+
+    def get_totals(self) -> dict:
+        return {"total": self.basket.get_total_price(),
+                "discounted_total": self.pricer.get_discounted_price(self.basket)}
+
+    def get_counted_items(self) -> list[tuple[str, int]]:
+        return [(line.item.name, line.quantity) for line in self.basket.get_lines()]
+
+    def get_counted_basket_items(self) -> list[tuple[Item, int]]:
+        return [(line.item, line.quantity) for line in self.basket.get_lines()]
+
+    def checkout(self, receipt_format: str) -> dict:
+        sequence = self.pricer.get_best_sequence(self.basket)
+        basket = self.system.apply_discount_sequence(self.basket.fork(), sequence)
+        return get_checkout_result(basket, receipt_format)
+
+    def empty(self) -> None:
+        self.basket = CountBasket()
+        if self.snapshot is not self.system.snapshot:
+            self.snapshot = self.system.snapshot
+            self.pricer.reset(list(enumerate(self.snapshot.discounts)))
+
+
+class TillServer:
+    def __init__(self, system: System, workers: int | None = None, inline_group_size: int = 4,
+                 config_path: str | None = None, store_path: str | None = None,
+                 journal: Journal | None = None) -> None:
+        self.system = system
+        self.journal = journal
+        self.workers = workers or os.cpu_count() or 1
+        self.inline_group_size = inline_group_size
+        self.config_path = config_path
+        self.store_path = store_path
+        self.cache = ResultCache()
+        self.executor = None
+        self.snapshot_directory = TemporaryDirectory()
+        self.snapshot_path = None
+        self.start_workers()
+
+    def start_workers(self) -> None:
+        snapshot = self.system.snapshot
+        snapshot_path = os.path.join(self.snapshot_directory.name, f"snapshot-{snapshot.version}.bin")
+        write_snapshot(snapshot, snapshot_path)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=init_worker,
+                                            initargs=(snapshot_path, registry.enabled,
+                                                      registry.trace_events is not None))
+        if self.snapshot_path is not None:
+            os.remove(self.snapshot_path)
+        self.snapshot_path = snapshot_path
+        self.executor_snapshot = snapshot
+
+    def reload(self) -> bool:
+        system = load_system(self.config_path, self.store_path)
+        if system is None:
+            return False
+        self.system.load(system.catalog, list(system.discounts))
+        self.start_workers()
+        return True
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        lane = Lane(self.system, self.cache)
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if isinstance(request, dict):
+                        response = await self.handle_request(lane, request)
+                    else:
+                        response = {"ok": False, "error": "the request is not an object"}
+                except (ValueError, KeyError, TypeError) as error:
+                    response = {"ok": False, "error": str(error)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+                if response.get("bye"):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, lane: Lane, request: dict) -> dict:
+        match request.get("command"):
+            case "scan":
+                counted_items = parse_counted_items(request["items"])
+                nonexistent_items = [item_name for item_name, _ in counted_items
+                                     if item_name not in lane.snapshot.catalog]
+                if nonexistent_items:
+                    return {"ok": False, "error": f"items {nonexistent_items} do not exist"}
+                group_indices = lane.add_items(counted_items)
+                pool_group_indices = [group_index for group_index in group_indices
+                                      if len(lane.pricer.groups[group_index]) > self.inline_group_size]
+                lane.pricer.solve_groups(lane.basket, [group_index for group_index in group_indices
+                                                       if group_index not in pool_group_indices])
+                if pool_group_indices:
+                    await self.solve_in_pool(lane, pool_group_indices)
+                return {"ok": True, **lane.get_totals()}
+            case "total":
+                return {"ok": True, **lane.get_totals()}
+            case "finalize":
+                receipt_format = request.get("format", "text")
+                if receipt_format not in RECEIPT_FORMATS:
+                    return {"ok": False, "error": f"unknown receipt format \"{receipt_format}\""}
+                if lane.basket.is_empty():
+                    return {"ok": False, "error": "the basket is empty"}
+                result = lane.checkout(receipt_format)
+                result["version"] = lane.snapshot.version
+                lines = result.pop("lines")
+                if self.journal is not None:
+                    result["journal_id"] = self.journal.append(lines, lane.snapshot.version)
+                lane.empty()
+                return {"ok": True, **result}
+            case "discard":
+                lane.empty()
+                return {"ok": True}
+            case "catalog":
+                return {"ok": True, "items": [{"name": item.name, "price": item.normal_price,
+                                               "category": item.category} for item in lane.snapshot.catalog]}
+            case "discounts":
+                return {"ok": True, "discounts": [discount.get_info_str() for discount in lane.snapshot.discounts]}
+            case "reload":
+                if not self.reload():
+                    return {"ok": False, "error": "could not load the configuration"}
+                return {"ok": True, "version": self.system.snapshot.version}
+            case "quit":
+                return {"ok": True, "bye": True}
+            case command:
+                return {"ok": False, "error": f"unknown command \"{command}\""}
+
+    async def solve_in_pool(self, lane: Lane, group_indices: list[int]) -> None:
+        loop = asyncio.get_running_loop()
+        if lane.snapshot is self.executor_snapshot:
+            call = (solve_groups, lane.get_counted_items(), lane.get_groups_discount_ids(group_indices))
+        else:
+            call = (solve_discount_groups, lane.get_counted_basket_items(), lane.get_groups(group_indices))
+        results, metrics = await loop.run_in_executor(self.executor, *call)
+        registry.merge(metrics)
+        lane.set_results(group_indices, results)
+
+    async def serve(self, address: str) -> None:
+        if address.startswith("unix:"):
+            server = await asyncio.start_unix_server(self.handle_client, path=address[len("unix:"):],
+                                                     limit=2 ** 20)
+        else:
+            host, _, port = address.rpartition(":")
+            server = await asyncio.start_server(self.handle_client, host or "127.0.0.1", int(port),
+                                                limit=2 ** 20, backlog=1024)
+        print(f"Serving on {address}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+        self.snapshot_directory.cleanup()
+
+
+def main(config_path: str | None, store_path: str | None, address: str,
+         workers: int | None, inline_group_size: int, journal: Journal | None = None) -> None:
+    system = load_system(config_path, store_path)
+    if system is None:
+        return
+    server = TillServer(system, workers, inline_group_size, config_path, store_path, journal)
+    try:
+        asyncio.run(server.serve(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,212 @@
+import heapq
+import json
+import os
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from tempfile import TemporaryDirectory
+from typing import Any, Iterator
+
+from batch import parse_counted_items, read_baskets
+from config import load_system
+from importer import import_records, read_records
+from journal import Journal
+from mapped import load_mapped_system, write_snapshot
+from receipt import get_line_prices
+from system import System
+
+worker_systems = None
+
+
+class SimulationReport:
+    def __init__(self, top: int = 10) -> None:
+        self.top = top
+        self.baskets_count = 0
+        self.errors_count = 0
+        self.total = 0
+        self.discounted_totals = {"current": 0, "candidate": 0}
+        self.usage = {"current": {}, "candidate": {}}
+        self.largest_changes = []
+
+    def add_basket(self, basket_id: str, total: int, discounted_totals: dict[str, int]) -> None:
+        self.baskets_count += 1
+        self.total += total
+        for configuration, discounted_total in discounted_totals.items():
+            self.discounted_totals[configuration] += discounted_total
+        change = discounted_totals["candidate"] - discounted_totals["current"]
+        if change:
+            self.add_change((abs(change), basket_id, discounted_totals["current"], discounted_totals["candidate"]))
+
+    def add_change(self, change: tuple[int, str, int, int]) -> None:
+        if len(self.largest_changes) < self.top:
+            heapq.heappush(self.largest_changes, change)
+        elif change > self.largest_changes[0]:
+            heapq.heapreplace(self.largest_changes, change)
+
+    def add_usage(self, configuration: str, discount_number: int, units: int, savings: int,
+                  baskets_count: int = 1) -> None:
+        usage = self.usage[configuration].setdefault(discount_number, {"baskets": 0, "units": 0, "savings": 0})
+        usage["baskets"] += baskets_count
+        usage["units"] += units
+        usage["savings"] += savings
+
+    def merge(self, other: "SimulationReport") -> None:
+        self.baskets_count += other.baskets_count
+        self.errors_count += other.errors_count
+        self.total += other.total
+        for configuration in self.discounted_totals:
+            self.discounted_totals[configuration] += other.discounted_totals[configuration]
+            for discount_number, usage in other.usage[configuration].items():
+                self.add_usage(configuration, discount_number, usage["units"], usage["savings"], usage["baskets"])
+        for change in other.largest_changes:
+            self.add_change(change)
+
+    def get_data(self) -> dict[str, Any]:
+        return {"baskets": self.baskets_count, "errors": self.errors_count, "total": self.total,
+                **{configuration: {"discounted_total": discounted_total,
+                                   "savings": self.total - discounted_total,
+                                   "discounts": {str(number): usage for number, usage
+                                                 in sorted(self.usage[configuration].items())}}
+                   for configuration, discounted_total in self.discounted_totals.items()},
+                "largest_changes": [{"id": basket_id, "current": current, "candidate": candidate,
+                                     "change": candidate - current}
+                                    for _, basket_id, current, candidate in sorted(self.largest_changes, reverse=True)]}
+
+    def get_text(self) -> str:
+        data = self.get_data()
+        lines = [f"Baskets: {data['baskets']} ({data['errors']} skipped), total before discounts: {data['total']}c"]
+        for configuration in ("current", "candidate"):
+            lines.append(f"{configuration.capitalize()}: {data[configuration]['discounted_total']}c, "
+                         f"savings given away: {data[configuration]['savings']}c")
+            for number, usage in data[configuration]["discounts"].items():
+                lines.append(f"  discount {number}: {usage['baskets']} baskets, "
+                             f"{usage['units']} units, {usage['savings']}c")
+        change = data["candidate"]["savings"] - data["current"]["savings"]
+        lines.append(f"Change in savings: {change:+d}c")
+        lines.append("Largest price changes:")
+        lines += [f"  basket {change['id']}: {change['current']}c -> {change['candidate']}c ({change['change']:+d}c)"
+                  for change in data["largest_changes"]]
+        return "\n".join(lines) + "\n"
+
+
+def read_journal_baskets(path: str) -> Iterator[tuple[str, list[str]]]:
+    journal = Journal(path, read_only=True)
+    try:
+        for record in journal:
+            yield str(record["basket_id"] or record["id"]), [f"{line['name']}*{line['quantity']}"
+                                                              for line in record["lines"]]
+    finally:
+        journal.close()
+
+
+def load_systems(config_path: str | None, store_path: str | None, candidate_path: str) -> dict[str, System]:
+    current = load_system(config_path, store_path)
+    if current is None:
+        raise ValueError("invalid current configuration")
+    candidate = System(count_basket=True)
+    candidate.load(current.catalog, [])
+    records = (record for record in read_records(candidate_path)
+               if not isinstance(record, dict) or record.get("type", "item") != "item"
+               or record.get("name") not in current.catalog)
+    report = import_records(candidate, records)
+    if not report.is_ok():
+        raise ValueError(report.get_text())
+    return {"current": current, "candidate": candidate}
+
+
+def init_worker(snapshot_paths: dict[str, str]) -> None:
+    global worker_systems
+    worker_systems = {configuration: load_mapped_system(path) for configuration, path in snapshot_paths.items()}
+
+
+def simulate_chunk(chunk: list[tuple[str, list[str] | ValueError]], top: int) -> SimulationReport:
+    report = SimulationReport(top)
+    for basket_id, items in chunk:
+        try:
+            counted_items = parse_counted_items(items)
+        except ValueError:
+            report.errors_count += 1
+            continue
+        if any(item_name not in worker_systems["current"].catalog for item_name, _ in counted_items):
+            report.errors_count += 1
+            continue
+
+        discounted_totals = {}
+        for configuration, system in worker_systems.items():
+            system.empty_basket()
+            system.add_counted_items_to_basket(counted_items)
+            system.apply_best_discount_combination()
+            savings_by_discount = {}
+            for line, quantity in system.basket.get_receipt_lines():
+                applied_discount_id = line[4]
+                if applied_discount_id is not None:
+                    total, discounted_total = get_line_prices(line, quantity)
+                    units, savings = savings_by_discount.get(applied_discount_id, (0, 0))
+                    savings_by_discount[applied_discount_id] = (
+                        units + quantity, savings + total - discounted_total)
+            for discount_id, (units, savings) in savings_by_discount.items():
+                report.add_usage(configuration, discount_id + 1, units, savings)
+            discounted_totals[configuration] = system.basket.get_discounted_price()
+        report.add_basket(basket_id, system.basket.get_total_price(), discounted_totals)
+    return report
+
+
+def simulate(config_path: str | None, store_path: str | None, candidate_path: str,
+             baskets: Iterator[tuple[str, list[str] | ValueError]], workers: int | None = None,
+             top: int = 10, chunk_size: int = 256) -> SimulationReport:
+    report = SimulationReport(top)
+    chunks = iter(lambda: list(islice(baskets, chunk_size)), [])
+    workers = workers or os.cpu_count() or 1
+    systems = load_systems(config_path, store_path, candidate_path)
+    if workers == 1:
+        global worker_systems
+        worker_systems = systems
+        for chunk in chunks:
+            report.merge(simulate_chunk(chunk, top))
+        return report
+
+    with TemporaryDirectory() as directory:
+        snapshot_paths = {}
+        for configuration, system in systems.items():
+            snapshot_paths[configuration] = os.path.join(directory, f"{configuration}.bin")
+            write_snapshot(system.snapshot, snapshot_paths[configuration])
+        max_pending_chunks = workers * 4
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(snapshot_paths,)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(simulate_chunk, chunk, top))
+                if len(pending) >= max_pending_chunks:
+                    report.merge(pending.popleft().result())
+            while pending:
+                report.merge(pending.popleft().result())
+    return report
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Replay historical baskets against the current and a candidate set of discounts")
+    parser.add_argument("baskets", help="JSONL or CSV baskets file, or a transaction journal with --journal")
+    parser.add_argument("--candidate", required=True,
+                        help="JSON, JSONL or CSV file with the candidate discounts (and any new products)")
+    parser.add_argument("--config", help="JSON file with the current catalog and discounts")
+    parser.add_argument("--store", help="SQLite store with the current catalog and discounts")
+    parser.add_argument("--journal", action="store_true", help="read the baskets from a transaction journal")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--top", type=int, default=10, help="number of most changed baskets to report")
+    parser.add_argument("--format", choices=["text", "json"], default="text")
+    arguments = parser.parse_args()
+    if arguments.config is None and arguments.store is None:
+        parser.error("--config or --store is required")
+
+    baskets = read_journal_baskets(arguments.baskets) if arguments.journal else read_baskets(arguments.baskets)
+    report = simulate(arguments.config, arguments.store, arguments.candidate, baskets,
+                      arguments.workers, arguments.top)
+    if arguments.format == "json":
+        print(json.dumps(report.get_data(), indent=2))
+    else:
+        print(report.get_text(), end="")
+
+
+if __name__ == "__main__":
+    main()
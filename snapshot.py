@@ -0,0 +1,17 @@
+from catalog import Catalog
+from discounts import Discount
+
+
+class Snapshot:
+    """A published version of the catalog and discounts.
+
+    Snapshots are never changed after they are published. Edits copy the
+    parts they change, share the rest with the previous version and publish
+    the result by replacing System.snapshot, so a reader that took a
+    snapshot keeps a consistent view without locking.
+    """
+
+    def __init__(self, version: int, catalog: Catalog, discounts: tuple[Discount, ...]) -> None:
+        self.version = version
+        self.catalog = catalog
+        self.discounts = discounts
@@ -0,0 +1,77 @@
+import json
+import sqlite3
+from typing import Iterator
+
+from discounts import Discount, create_discount
+from item import Item
+
+
+class Store:
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS items (name TEXT PRIMARY KEY, category TEXT NOT NULL, price INTEGER NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS discounts (id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)")
+        self.discount_ids = []
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def is_empty(self) -> bool:
+        return self.connection.execute(
+            "SELECT NOT EXISTS (SELECT 1 FROM items) AND NOT EXISTS (SELECT 1 FROM discounts)").fetchone()[0] == 1
+
+    def load_items(self) -> Iterator[Item]:
+        rows = self.connection.execute(
+            "SELECT name, category, price FROM items ORDER BY rowid")
+        return (Item(name, category, price) for name, category, price in rows)
+
+    def load_discounts(self) -> list[Discount]:
+        rows = self.connection.execute(
+            "SELECT id, data FROM discounts ORDER BY id").fetchall()
+        self.discount_ids = [discount_id for discount_id, _ in rows]
+        return [create_discount(json.loads(data)) for _, data in rows]
+
+    def add_item(self, item: Item) -> None:
+        with self.connection:
+            self.connection.execute("INSERT INTO items (name, category, price) VALUES (?, ?, ?)",
+                                    (item.name, item.category, item.normal_price))
+
+    def import_data(self, items: list[Item], discounts: list[Discount]) -> None:
+        with self.connection:
+            self.connection.executemany("INSERT INTO items (name, category, price) VALUES (?, ?, ?)",
+                                        ((item.name, item.category, item.normal_price) for item in items))
+            discount_ids = [self.connection.execute("INSERT INTO discounts (data) VALUES (?)",
+                                                    (json.dumps(discount.get_data()),)).lastrowid
+                            for discount in discounts]
+        self.discount_ids.extend(discount_ids)
+
+    def update_item(self, item_name: str, item: Item) -> None:
+        with self.connection:
+            self.connection.execute("UPDATE items SET name = ?, category = ?, price = ? WHERE name = ?",
+                                    (item.name, item.category, item.normal_price, item_name))
+
+    def remove_item(self, item_name: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM items WHERE name = ?", (item_name,))
+
+    def add_discount(self, discount: Discount) -> None:
+        with self.connection:
+            cursor = self.connection.execute("INSERT INTO discounts (data) VALUES (?)",
+                                             (json.dumps(discount.get_data()),))
+        self.discount_ids.append(cursor.lastrowid)
+
+    def update_discount(self, discount_index: int, discount: Discount) -> None:
+        with self.connection:
+            self.connection.execute("UPDATE discounts SET data = ? WHERE id = ?",
+                                    (json.dumps(discount.get_data()), self.discount_ids[discount_index]))
+
+    def remove_discount(self, discount_index: int) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM discounts WHERE id = ?",
+                                    (self.discount_ids.pop(discount_index),))
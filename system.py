@@ -1,64 +1,128 @@
-from itertools import permutations
-from copy import deepcopy
+from copy import copy
+from typing import Iterable
 
 from item import Item
+from catalog import Catalog
 from discounts import Discount, BundleDiscount, ProgressiveDiscount, BulkDiscount
-from basket import Basket
+from basket import Basket, CountBasket
+from solver import DiscountSolver
+from parallel import ParallelSolver
+from anytime import AnytimeSolver
+from pricing import IncrementalPricer
+from quote import PriceFunction, get_steps
+from cache import ResultCache
+from store import Store
+from metrics import instrumented, registry
+from snapshot import Snapshot
 import validation
 
 
 class System:
-    def __init__(self) -> None:
-        self.items = []
-        self.discounts = []
-        self.basket = Basket()
+    def __init__(self, count_basket: bool = False, parallel_workers: int | None = None,
+                 budget: float | None = None) -> None:
+        self.snapshot = Snapshot(0, Catalog(), ())
+        self.basket_type = CountBasket if count_basket else Basket
+        self.basket = self.basket_type()
+        if budget is not None:
+            self.solver = AnytimeSolver(budget)
+        elif parallel_workers:
+            self.solver = ParallelSolver(parallel_workers)
+        else:
+            self.solver = DiscountSolver()
+        self.pricer = IncrementalPricer(self.solver, ResultCache())
+        self.store = None
+        self.journal = None
+        self.price_functions = {}
+        self.price_functions_snapshot = None
+
+    @property
+    def catalog(self) -> Catalog:
+        return self.snapshot.catalog
+
+    @property
+    def discounts(self) -> tuple[Discount, ...]:
+        return self.snapshot.discounts
+
+    def publish(self, catalog: Catalog | None = None, discounts: tuple[Discount, ...] | None = None) -> None:
+        snapshot = self.snapshot
+        self.snapshot = Snapshot(snapshot.version + 1,
+                                 catalog if catalog is not None else snapshot.catalog,
+                                 discounts if discounts is not None else snapshot.discounts)
+        if discounts is not None:
+            self.discounts_changed()
+
+    def load_snapshot(self, snapshot: Snapshot) -> None:
+        self.pricer.cache.clear()
+        self.snapshot = snapshot
+        self.discounts_changed()
+
+    def attach_store(self, store: Store) -> None:
+        self.load(store.load_items(), store.load_discounts())
+        self.store = store
+
+    def load(self, items: Iterable[Item], discounts: list[Discount]) -> None:
+        catalog = Catalog()
+        catalog.load(items)
+        self.pricer.cache.clear()
+        self.publish(catalog, tuple(discounts))
 
     def add_catalog_item(self, name: str, price: str, category: str) -> bool:
-        items_names = self.get_items_names()
-        if not validation.validate_catalog_item(name, price, items_names, category):
+        if not validation.validate_catalog_item(name, price, self.catalog, category):
             return False
         new_item = Item(name=name, category=category, normal_price=int(price))
-        self.items.append(new_item)
+        catalog = self.catalog.copy()
+        catalog.add(new_item)
+        self.publish(catalog)
+        if self.store is not None:
+            self.store.add_item(new_item)
         return True
 
     def update_catalog_item(self, name: str, new_name: str, new_price: str, new_category) -> bool:
-        items_names = self.get_items_names()
-        if not validation.validate_items_exist([name], self.items):
+        if not validation.validate_items_exist([name], self.catalog):
             return False
         if new_name != name and new_name != '-':
-            if not validation.validate_item_does_not_exist(new_name, items_names):
+            if not validation.validate_item_does_not_exist(new_name, self.catalog):
                 return False
 
-        item_idx = items_names.index(name)
-        item = self.items[item_idx]
+        item = self.catalog.get(name)
+        updated_name, updated_category, updated_price = item.name, item.category, item.normal_price
 
         if new_name != name and new_name != '-':
-            item.name = new_name
+            updated_name = new_name
         if new_category != '-':
             if not validation.validate_item_category(new_category):
                 return False
-            item.category = new_category
+            updated_category = new_category
         if new_price != '-':
             if not validation.validate_item_price(new_price):
                 return False
-            item.normal_price = int(new_price)
+            updated_price = int(new_price)
+        updated_item = Item(
+            name=updated_name, category=updated_category, normal_price=updated_price)
+        catalog = self.catalog.copy()
+        catalog.update(name, updated_item)
+        self.publish(catalog)
+        if self.store is not None:
+            self.store.update_item(name, updated_item)
         return True
 
     def remove_catalog_item(self, name: str) -> bool:
-        if not validation.validate_items_exist([name], self.items):
+        if not validation.validate_items_exist([name], self.catalog):
             return False
-        items_names = self.get_items_names()
-        item_idx = items_names.index(name)
-        self.items.pop(item_idx)
+        catalog = self.catalog.copy()
+        catalog.remove(name)
+        self.publish(catalog)
+        if self.store is not None:
+            self.store.remove_item(name)
         return True
 
     def view_catalog_items(self) -> None:
-        if not self.items:
+        if not self.catalog:
             print("The catalog is empty.\n")
             return
 
         print("Catalog items: (name, price, category)")
-        for item in self.items:
+        for item in self.catalog:
             print(f"{item.name}, {item.normal_price}, {item.category}")
         print()
 
@@ -75,27 +139,27 @@ class System:
         print()
 
     def add_bundle_discount(self, threshold, quantity_to_pay, bundles) -> bool:
-        if not validation.validate_bundle_discount_input(threshold, quantity_to_pay, bundles, self.items):
+        if not validation.validate_bundle_discount_input(threshold, quantity_to_pay, bundles, self.catalog):
             return False
         discount = BundleDiscount(bundles, int(
             threshold), int(quantity_to_pay))
-        self.discounts.append(discount)
+        self.add_discount(discount)
         return True
 
     def add_progressive_discount(self, threshold: str, percentage_off_next: str, item: str) -> bool:
-        if not validation.validate_progressive_discount_input(threshold, percentage_off_next, item, self.items):
+        if not validation.validate_progressive_discount_input(threshold, percentage_off_next, item, self.catalog):
             return False
         discount = ProgressiveDiscount(
             item, int(threshold), int(percentage_off_next))
-        self.discounts.append(discount)
+        self.add_discount(discount)
         return True
 
     def add_bulk_discount(self, threshold: str, discounted_price: str, item: str) -> bool:
-        if not validation.validate_bulk_discount_input(threshold, discounted_price, item, self.items):
+        if not validation.validate_bulk_discount_input(threshold, discounted_price, item, self.catalog):
             return False
         discount = BulkDiscount(item=item, threshold=int(
             threshold), new_price=int(discounted_price))
-        self.discounts.append(discount)
+        self.add_discount(discount)
         return True
 
     def update_bundle_discount(self, discount_index: int, bundles: list[list[str]] | None,
@@ -115,12 +179,14 @@ class System:
         if bundles is not None:
             bundles_items = [
                 item_name for bundle in bundles for item_name in bundle]
-            if not validation.validate_items_exist(bundles_items, self.items):
+            if not validation.validate_items_exist(bundles_items, self.catalog):
                 return False
             new_bundles = bundles
 
-        self.discounts[discount_index].update_info_from_list(
+        discount = copy(self.discounts[discount_index])
+        discount.update_info_from_list(
             new_bundles, [new_threshold, new_quantity_to_pay])
+        self.replace_discount(discount_index, discount)
         return True
 
     def update_progressive_discount(self, discount_index: int, item_name: str, threshold: str, percentage: str) -> bool:
@@ -135,12 +201,14 @@ class System:
                 return False
             new_percentage = int(percentage)
         if item_name != '-':
-            if not validation.validate_items_exist([item_name], self.items):
+            if not validation.validate_items_exist([item_name], self.catalog):
                 return False
             new_item_name = item_name
 
-        self.discounts[discount_index].update_info_from_list(
+        discount = copy(self.discounts[discount_index])
+        discount.update_info_from_list(
             new_item_name, [new_threshold, new_percentage])
+        self.replace_discount(discount_index, discount)
         return True
 
     def update_bulk_discount(self, discount_index: int, item_name: str, threshold: str, discounted_price: str) -> bool:
@@ -155,40 +223,101 @@ class System:
                 return False
             new_discounted_price = int(discounted_price)
         if item_name != '-':
-            if not validation.validate_items_exist([item_name], self.items):
+            if not validation.validate_items_exist([item_name], self.catalog):
                 return False
             new_item_name = item_name
 
-        self.discounts[discount_index].update_info_from_list(
+        discount = copy(self.discounts[discount_index])
+        discount.update_info_from_list(
             new_item_name, [new_threshold, new_discounted_price])
+        self.replace_discount(discount_index, discount)
         return True
 
+    def import_data(self, items: list[Item], discounts: list[Discount]) -> None:
+        catalog = self.catalog.copy()
+        for item in items:
+            catalog.add(item)
+        if self.store is not None:
+            self.store.import_data(items, discounts)
+        self.publish(catalog, self.discounts + tuple(discounts) if discounts else None)
+
+    def add_discount(self, discount: Discount) -> None:
+        if self.store is not None:
+            self.store.add_discount(discount)
+        self.publish(discounts=self.discounts + (discount,))
+
+    def replace_discount(self, discount_index: int, discount: Discount) -> None:
+        self.pricer.cache.invalidate(self.discounts[discount_index])
+        if self.store is not None:
+            self.store.update_discount(discount_index, discount)
+        discounts = list(self.discounts)
+        discounts[discount_index] = discount
+        self.publish(discounts=tuple(discounts))
+
     def remove_discount(self, index) -> None:
-        self.discounts.pop(index)
+        self.pricer.cache.invalidate(self.discounts[index])
+        if self.store is not None:
+            self.store.remove_discount(index)
+        self.publish(discounts=self.discounts[:index] + self.discounts[index + 1:])
+
+    def discounts_changed(self) -> None:
+        self.pricer.reset(list(enumerate(self.discounts)))
 
     def add_items_to_basket(self, items: list[str]) -> None:
         for item_name in items:
-            item_idx = self.find_item_index_by_name(item_name)
-            self.basket.items.append(deepcopy(self.items[item_idx]))
+            self.basket.add_item(self.catalog.get(item_name))
+        self.pricer.update(self.basket, set(items))
 
-    def apply_best_discount_combination(self) -> None:
-        discounts = enumerate(self.discounts)
-        baskets = [self.apply_discount_sequence(
-            deepcopy(self.basket), p) for p in permutations(discounts)]
-        self.basket = min(
-            baskets, key=lambda basket: basket.get_discounted_price())
+    def add_counted_items_to_basket(self, counted_items: list[tuple[str, int]]) -> None:
+        for item_name, quantity in counted_items:
+            self.basket.add_item(self.catalog.get(item_name), quantity)
+        self.pricer.update(self.basket, {item_name for item_name, _ in counted_items})
+
+    def get_discounted_total(self) -> int:
+        return self.pricer.get_discounted_price(self.basket)
 
-    def apply_discount_sequence(self, basket: Basket, discounts: tuple[tuple[int, Discount], ...]) -> Basket:
+    @instrumented("checkout.apply_best_discount_combination",
+                  lambda system: {"basket_size": system.basket.get_size(),
+                                  "active_discounts": len(system.discounts)})
+    def apply_best_discount_combination(self) -> None:
+        sequence = self.pricer.get_best_sequence(self.basket)
+        if registry.enabled:
+            registry.increment("checkout.proven" if self.pricer.is_proven() else "checkout.unproven")
+            registry.observe("checkout.gap", self.pricer.get_gap())
+        self.basket = self.apply_discount_sequence(
+            self.basket.fork(), sequence)
+
+    @instrumented("checkout.apply_discount_sequence",
+                  lambda system, basket, discounts: {"basket_size": basket.get_size(),
+                                                     "discounts": len(discounts)})
+    def apply_discount_sequence(self, basket: Basket, discounts: list[tuple[int, Discount]]) -> Basket:
         for discount_id, current_discount in discounts:
-            current_discount.apply_to_basket(basket, discount_id)
+            basket.apply_discount(current_discount, discount_id)
         return basket
 
-    def empty_basket(self) -> None:
-        self.basket = Basket()
+    def record_checkout(self) -> int | None:
+        if self.journal is None:
+            return None
+        return self.journal.append(self.basket.get_receipt_lines(), self.snapshot.version)
+
+    def quote(self, item_name: str, quantity: str) -> tuple[int, int] | None:
+        if not validation.validate_items_exist([item_name], self.catalog) or \
+                not validation.validate_item_quantity(quantity):
+            return None
+        return self.get_quote(item_name, int(quantity))
+
+    def get_quote(self, item_name: str, quantity: int) -> tuple[int, int]:
+        if self.price_functions_snapshot is not self.snapshot:
+            self.price_functions = {}
+            self.price_functions_snapshot = self.snapshot
+        price_function = self.price_functions.get(item_name)
+        if price_function is None:
+            price_function = self.price_functions[item_name] = PriceFunction(
+                self.catalog.get(item_name).normal_price, get_steps(item_name, self.discounts))
+        return quantity * price_function.price, price_function.get_price(quantity)
 
-    def find_item_index_by_name(self, item_name: str) -> int:
-        items_names = self.get_items_names()
-        return items_names.index(item_name)
+    def empty_basket(self) -> None:
+        self.basket = self.basket_type()
 
-    def get_items_names(self):
-        return list(map(lambda item: item.name, self.items))
+    def get_items_names(self) -> list[str]:
+        return self.catalog.get_items_names()
@@ -1,16 +1,16 @@
 from typing import Any
 
-from item import Item
+from catalog import Catalog
 
 
-def validate_catalog_item(name: str, price: str, existing_items: list[str], category: str) -> bool:
+def validate_catalog_item(name: str, price: str, existing_items: Catalog, category: str) -> bool:
     return validate_item_does_not_exist(name, existing_items) and \
         validate_item_price(price) and \
         validate_item_category(category)
 
 
-def validate_item_does_not_exist(item_name: str, existing_items_names: list[str]):
-    if item_name in existing_items_names:
+def validate_item_does_not_exist(item_name: str, existing_items: Catalog) -> bool:
+    if item_name in existing_items:
         print("Invalid item name: Item with the same name already exists.")
         return False
     return True
@@ -22,34 +22,39 @@ def validate_item_price(price: str) -> bool:
         return False
     return True
 
+def validate_item_quantity(quantity: str) -> bool:
+    if not quantity.isnumeric() or int(quantity) == 0:
+        print("Invalid item quantity.")
+        return False
+    return True
+
 def validate_item_category(category: str) -> bool:
     if category == "":
         print("Invalid category value.")
         return False
     return True
 
-def validate_bundle_discount_input(threshold: str, quantity_to_pay: str, bundles: list[list[str]], existing_items: list[Item]) -> bool:
+def validate_bundle_discount_input(threshold: str, quantity_to_pay: str, bundles: list[list[str]], existing_items: Catalog) -> bool:
     bundles_items = [item_name for bundle in bundles for item_name in bundle]
     return validate_threshold(threshold) and\
         validate_quantity_to_pay(quantity_to_pay) and \
         validate_items_exist(bundles_items, existing_items)
 
 
-def validate_bulk_discount_input(threshold: str, discounted_price: str, item: str, existing_items: list[Item]) -> bool:
+def validate_bulk_discount_input(threshold: str, discounted_price: str, item: str, existing_items: Catalog) -> bool:
     return validate_threshold(threshold) and \
         validate_discounted_price_input(discounted_price) and \
         validate_items_exist([item], existing_items)
 
 
-def validate_progressive_discount_input(threshold: str, percentage_off_next: str, item: str, existing_items: list[Item]) -> bool:
+def validate_progressive_discount_input(threshold: str, percentage_off_next: str, item: str, existing_items: Catalog) -> bool:
     return validate_threshold(threshold) and \
         validate_percentage_input(percentage_off_next) and \
         validate_items_exist([item], existing_items)
 
 
-def validate_items_exist(items: list[str], existing_items: list[Item]) -> bool:
-    existing_names = list(map(lambda item: item.name, existing_items))
-    nonexistent_items = [name for name in items if name not in existing_names]
+def validate_items_exist(items: list[str], existing_items: Catalog) -> bool:
+    nonexistent_items = [name for name in items if name not in existing_items]
     if nonexistent_items:
         if len(nonexistent_items) == 1:
             message = f"Invalid input: item \"{nonexistent_items[0]}\" does not exist."